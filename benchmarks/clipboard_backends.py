@@ -0,0 +1,106 @@
+"""Per-call cost of reading and writing the clipboard through each available access path.
+
+  spawn_per_call  one `cat` process per call: the floor of what pyperclip pays on X11 and
+                  Wayland, where every paste and copy starts xclip, xsel or wl-paste
+  pyperclip       pyperclip itself, when it can reach a clipboard on this machine
+  helper_ipc      the persistent helper serving an in-memory clipboard, isolating its IPC cost
+  helper          the persistent helper on the real X11 clipboard, when a display is available
+  native          the platform backend when it talks to the OS without a process (macOS, Windows)
+
+Run from the repository root:
+
+    python -m benchmarks.clipboard_backends --calls 200
+
+Results are printed as JSON so runs from different versions can be compared.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from clipboard import ClipboardBackendError, ClipboardHelper, create_clipboard_backend
+
+SIZES = [64, 64 * 1024]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(values):
+    return {
+        "calls": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p99": percentile(values, 0.99),
+        "calls_per_sec": len(values) / sum(values)
+    }
+
+class SpawnPerCall:
+    def __init__(self):
+        self.text = ""
+        self.spawned = 0
+        
+    def paste(self):
+        self.spawned += 1
+        return subprocess.run(["cat"], input=self.text.encode("utf-8"), capture_output=True, check=True).stdout.decode("utf-8")
+        
+    def copy(self, text):
+        self.spawned += 1
+        subprocess.run(["cat"], input=text.encode("utf-8"), stdout=subprocess.DEVNULL, check=True)
+        self.text = text
+
+def open_backends():
+    backends = {"spawn_per_call": SpawnPerCall}
+    try:
+        import pyperclip
+        pyperclip.paste()
+        backends["pyperclip"] = lambda: pyperclip
+    except Exception:
+        pass
+    backends["helper_ipc"] = lambda: ClipboardHelper(fake=True)
+    backends["helper"] = ClipboardHelper
+    native = create_clipboard_backend()
+    if native.name in ("nspasteboard", "win32-sequence"):
+        backends["native"] = lambda: native
+    return backends
+
+def measure(backend, calls, size):
+    text = "x" * size
+    copies, pastes = [], []
+    for index in range(calls):
+        value = f"{index} {text}"
+        started = time.perf_counter()
+        backend.copy(value)
+        copies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        if backend.paste() != value:
+            raise ClipboardBackendError("Pasted text does not match what was copied")
+        pastes.append(time.perf_counter() - started)
+    return {"payload_bytes": size, "copy": summarize(copies), "paste": summarize(pastes)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200, help="copies and pastes per size")
+    args = parser.parse_args()
+    
+    results = {"environment": {"python": platform.python_version(), "platform": platform.platform()}}
+    for name, factory in open_backends().items():
+        try:
+            backend = factory()
+            results[name] = {"results": [measure(backend, args.calls, size) for size in SIZES]}
+        except (ClipboardBackendError, OSError) as e:
+            results[name] = {"error": str(e)}
+            continue
+        # Processes started over the whole run: one per call, or one in total for the helper
+        if isinstance(backend, SpawnPerCall):
+            results[name]["processes_started"] = backend.spawned
+        elif isinstance(backend, ClipboardHelper):
+            results[name]["processes_started"] = backend.starts
+            backend.close()
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Load test for the relay hub with hundreds of simulated clients.
+
+The hub runs as a separate process on 127.0.0.1. Every client is a lightweight asyncio endpoint
+in this process with its own loopback address (127.1.0.1, 127.1.0.2, ...), which pairs with the
+hub, keeps sending discovery heartbeats and copies items that the hub fans out to all others.
+Linux routes all of 127.0.0.0/8 to the loopback interface; hub CPU and memory are read from /proc.
+
+Run from the repository root:
+
+    python -m benchmarks.hub_load --clients 200 --items 50
+
+Results are printed as JSON so runs from different versions can be compared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from config import PORT, PAIRING_PORT, UDP_BROADCAST_PORT
+from framing import FLAG_BINARY, read_frame, write_frame
+from message import Message, MessageType
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+HUB_IP = "127.0.0.1"
+HEARTBEAT_INTERVAL = 5
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values)
+    }
+
+def client_ip(index):
+    return f"127.1.{index // 250}.{index % 250 + 1}"
+
+class HubProcess:
+    def __init__(self, home):
+        env = dict(os.environ, HOME=home)
+        self.process = subprocess.Popen(
+            [sys.executable, "hub.py", "--bind", HUB_IP, "--accept-pairing"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        
+    def cpu_seconds(self):
+        with open(f"/proc/{self.process.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15, counted from the pid
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+        
+    def memory(self):
+        values = {}
+        with open(f"/proc/{self.process.pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, value = line.split(":")
+                    values[name] = int(value.split()[0]) * 1024
+        return {"rss_bytes": values.get("VmRSS"), "peak_rss_bytes": values.get("VmHWM")}
+        
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+class Client:
+    """Just enough of the protocol to pair with the hub, send items and receive its fan-out"""
+    
+    def __init__(self, index, deliveries):
+        self.ip = client_ip(index)
+        self.name = f"client-{index}"
+        self.deliveries = deliveries  # item id -> list of arrival times
+        self.paired = asyncio.Event()
+        self.servers = []
+        self.beacon = Message(
+            MessageType.DISCOVERY,
+            {"capabilities": ["binary"]},
+            self.ip,
+            self.name
+        ).to_json().encode("utf-8")
+        self.udp = None
+        self.writer = None
+        self.received = 0
+        
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.servers.append(await asyncio.start_server(self._handle_pairing, self.ip, PAIRING_PORT))
+        self.servers.append(await asyncio.start_server(self._handle_clipboard, self.ip, PORT))
+        self.udp, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, local_addr=(self.ip, 0))
+        
+    async def pair(self):
+        reader, writer = await asyncio.open_connection(HUB_IP, PAIRING_PORT, local_addr=(self.ip, 0))
+        request = Message(MessageType.PAIRING_REQUEST, {"capabilities": ["binary"]}, self.ip, self.name)
+        await write_frame(writer, request.to_json().encode("utf-8"))
+        writer.close()
+        self.heartbeat()
+        
+    def heartbeat(self):
+        self.udp.sendto(self.beacon, (HUB_IP, UDP_BROADCAST_PORT))
+        
+    async def _handle_pairing(self, reader, writer):
+        try:
+            frame = await read_frame(reader)
+            message = frame and Message.from_json(frame[1])
+            if message and message.type == MessageType.PAIRING_RESPONSE and message.data.get("accepted"):
+                self.paired.set()
+        finally:
+            writer.close()
+            
+    async def _handle_clipboard(self, reader, writer):
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if not frame:
+                    return
+                arrived = time.perf_counter()
+                flags, payload = frame
+                message = Message.from_bytes(payload) if flags & FLAG_BINARY else Message.from_json(payload)
+                if message and message.type == MessageType.CLIPBOARD_DATA:
+                    self.received += 1
+                    item = message.text.split(" ", 1)[0]
+                    if item in self.deliveries:
+                        self.deliveries[item].append(arrived)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            
+    async def send(self, text, recipients):
+        if self.writer is None:
+            _, self.writer = await asyncio.open_connection(HUB_IP, PORT, local_addr=(self.ip, 0))
+        # The hub only relays to the peers the sender names
+        message = Message(MessageType.CLIPBOARD_DATA, {"recipients": recipients}, self.ip, self.name, text.encode("utf-8"))
+        await write_frame(self.writer, message.to_bytes(), FLAG_BINARY)
+        
+    def close(self):
+        for server in self.servers:
+            server.close()
+        if self.udp:
+            self.udp.close()
+        if self.writer:
+            self.writer.close()
+
+async def heartbeats(clients):
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        for client in clients:
+            client.heartbeat()
+
+async def wait_for_hub(timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(HUB_IP, PAIRING_PORT)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+async def run(args, hub):
+    rng = random.Random(0)
+    deliveries = {}
+    clients = [Client(index, deliveries) for index in range(args.clients)]
+    for client in clients:
+        await client.start()
+    await wait_for_hub()
+    
+    started = time.perf_counter()
+    for client in clients:
+        await client.pair()
+    await asyncio.wait_for(asyncio.gather(*(client.paired.wait() for client in clients)), 60)
+    pairing_time = time.perf_counter() - started
+    heartbeat_task = asyncio.get_running_loop().create_task(heartbeats(clients))
+    # Let the hub settle its fan-out connections before measuring
+    await asyncio.sleep(1)
+    
+    cpu_before = hub.cpu_seconds()
+    sent_at = {}
+    filler = "x" * args.size
+    wall_started = time.perf_counter()
+    for number in range(args.items):
+        item = f"item-{number}"
+        deliveries[item] = []
+        sender = rng.choice(clients)
+        sent_at[item] = time.perf_counter()
+        await sender.send(f"{item} {filler}", [client.ip for client in clients if client is not sender])
+        await asyncio.sleep(1 / args.rate)
+        
+    # Wait until every item reached every other client, or the timeout passes
+    expected = args.clients - 1
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline and any(len(times) < expected for times in deliveries.values()):
+        await asyncio.sleep(0.1)
+    wall = time.perf_counter() - wall_started
+    cpu = hub.cpu_seconds() - cpu_before
+    heartbeat_task.cancel()
+    
+    each, complete = [], []
+    for item, times in deliveries.items():
+        each.extend(arrived - sent_at[item] for arrived in times)
+        if len(times) >= expected:
+            complete.append(max(times) - sent_at[item])
+    for client in clients:
+        client.close()
+        
+    return {
+        "pairing_seconds": pairing_time,
+        "items": args.items,
+        "deliveries": {"expected": args.items * expected, "received": len(each), "complete_items": len(complete)},
+        "delivery_latency": summarize(each),
+        "all_received_latency": summarize(complete),
+        "hub": dict(hub.memory(), cpu_seconds=cpu, cpu_utilisation=cpu / wall)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200, help="simulated client devices")
+    parser.add_argument("--items", type=int, default=50, help="clipboard items to fan out")
+    parser.add_argument("--size", type=int, default=1024, help="bytes per item")
+    parser.add_argument("--rate", type=float, default=5, help="items sent per second")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for outstanding deliveries")
+    args = parser.parse_args()
+    
+    if resource:
+        # Every client holds two listening sockets plus its connections to and from the hub
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        
+    home = tempfile.mkdtemp(prefix="clipboardsync-hub-")
+    hub = HubProcess(home)
+    try:
+        results = asyncio.run(run(args, hub))
+    finally:
+        hub.stop()
+        
+    results["environment"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "clients": args.clients,
+        "payload_bytes": args.size,
+        "rate": args.rate
+    }
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""End-to-end clipboard sync between NetworkManager instances on one host.
+
+Every node binds its own loopback address (127.0.0.2, 127.0.0.3, ...) and uses the in-memory
+fake clipboard. Linux routes all of 127.0.0.0/8 to the loopback interface; on macOS add the
+addresses first, for example `sudo ifconfig lo0 alias 127.0.0.2 up`.
+
+Run from the repository root:
+
+    python -m benchmarks.loopback_sync --peers 4 --rounds 50
+
+Results are printed as JSON so runs from different versions can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import time
+
+from config import SEND_DEADLINE
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SIZES = [1024, 64 * 1024, 1024 * 1024, 10 * 1024 * 1024, 50 * 1024 * 1024]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values)
+    }
+
+def peak_rss():
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def make_text(size, rng):
+    # Word-like text compresses roughly like real clipboard content
+    alphabet = string.ascii_letters + "     \n"
+    return "".join(rng.choices(alphabet, k=size))
+
+class Node:
+    def __init__(self, index, home):
+        # Imported here so DeviceManager and the history pick up the temporary HOME
+        from clipboard import FakeClipboard
+        from device_manager import DeviceManager
+        from history import ClipboardHistory
+        from network import NetworkManager
+        
+        self.ip = f"127.0.0.{index + 2}"
+        self.clipboard = FakeClipboard()
+        self.device_manager = DeviceManager()
+        history = ClipboardHistory(os.path.join(home, f"history-{index}.ring"))
+        self.network = NetworkManager(self.device_manager, self.clipboard, history, bind_ip=self.ip)
+        self.network.discovery_enabled = False
+        self.network.metrics_port = None
+        
+    def pair(self, other, send, receive):
+        from device_manager import DeviceStatus
+        device = self.device_manager.add_or_update_device(other.ip, other.ip, DeviceStatus.PAIRED, other.network.capabilities)
+        device.send_enabled = send
+        device.receive_enabled = receive
+        
+    def keep_alive(self):
+        # Discovery is off, so stand in for the heartbeat that keeps paired peers from timing out
+        from device_manager import DeviceStatus
+        for ip in list(self.device_manager.devices):
+            self.device_manager.add_or_update_device(ip, ip, DeviceStatus.PAIRED)
+            
+    def wait_for_text(self, text, timeout):
+        with self.clipboard.condition:
+            if not self.clipboard.condition.wait_for(lambda: self.clipboard.text == text, timeout):
+                raise TimeoutError(f"{self.ip} did not receive the clipboard within {timeout}s")
+        return time.perf_counter()
+
+class Cluster:
+    """One sender paired with every receiver; receivers never send back"""
+    
+    def __init__(self, peers, home, debounce, deadline):
+        self.sender = Node(0, home)
+        self.receivers = [Node(index + 1, home) for index in range(peers)]
+        for receiver in self.receivers:
+            self.sender.pair(receiver, True, False)
+            receiver.pair(self.sender, False, True)
+        for node in [self.sender] + self.receivers:
+            if not debounce:
+                node.network.debounce_window = 0
+            node.network.send_deadline = deadline
+            node.network.start()
+        self.counter = 0
+        
+    def set_fanout(self, count):
+        for index, receiver in enumerate(self.receivers):
+            self.sender.device_manager.devices[receiver.ip].send_enabled = index < count
+            
+    def transfer(self, text, receivers, timeout):
+        """Copy text on the sender and return seconds until each receiver holds it"""
+        # Salting every line keeps dedupe, offers and deltas against earlier rounds from skipping the transfer
+        self.counter += 1
+        text = text.replace("\n", f" {self.counter}\n")
+        for node in [self.sender] + self.receivers:
+            node.keep_alive()
+        started = time.perf_counter()
+        self.sender.clipboard.copy(text)
+        return [receiver.wait_for_text(text, timeout) - started for receiver in receivers]
+        
+    def stop(self):
+        for node in [self.sender] + self.receivers:
+            node.network.stop()
+        time.sleep(0.5)
+
+def bench_latency(cluster, rounds, rng):
+    cluster.set_fanout(1)
+    text = make_text(1024, rng)
+    latencies = [cluster.transfer(text, cluster.receivers[:1], 10)[0] for _ in range(rounds)]
+    return summarize(latencies)
+
+def bench_throughput(cluster, sizes, rng):
+    cluster.set_fanout(1)
+    results = []
+    for size in sizes:
+        text = make_text(size, rng)
+        rounds = max(2, min(20, (100 * 1024 * 1024) // size))
+        totals = cluster.sender.network.compression_totals
+        wire_before = totals["wire_bytes"]
+        cpu_before = time.process_time()
+        elapsed = []
+        for _ in range(rounds):
+            elapsed.append(cluster.transfer(text, cluster.receivers[:1], 120)[0])
+        cpu = time.process_time() - cpu_before
+        results.append({
+            "payload_bytes": size,
+            "rounds": rounds,
+            "latency": summarize(elapsed),
+            "mb_per_sec": size * rounds / sum(elapsed) / (1024 * 1024),
+            "wire_bytes_per_transfer": (totals["wire_bytes"] - wire_before) / rounds,
+            "cpu_seconds_per_transfer": cpu / rounds,
+            "peak_rss_bytes": peak_rss()
+        })
+    return results
+
+def bench_fanout(cluster, size, rounds, rng):
+    results = []
+    text = make_text(size, rng)
+    peers = len(cluster.receivers)
+    counts = sorted({2 ** power for power in range(peers.bit_length()) if 2 ** power <= peers} | {peers})
+    for count in counts:
+        cluster.set_fanout(count)
+        receivers = cluster.receivers[:count]
+        last = [max(cluster.transfer(text, receivers, 30)) for _ in range(rounds)]
+        results.append({"peers": count, "payload_bytes": size, "all_received": summarize(last)})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--peers", type=int, default=4, help="receiving instances")
+    parser.add_argument("--rounds", type=int, default=50, help="transfers per latency and fan-out measurement")
+    parser.add_argument("--max-size", type=int, default=SIZES[-1], help="largest throughput payload in bytes")
+    parser.add_argument("--debounce", action="store_true", help="keep the local change debounce window")
+    parser.add_argument("--deadline", type=float, default=SEND_DEADLINE, help="fixed part of the per-send deadline, in seconds")
+    args = parser.parse_args()
+    
+    # Keep paired devices and history out of the real configuration directory
+    home = tempfile.mkdtemp(prefix="clipboardsync-bench-")
+    os.environ["HOME"] = home
+    rng = random.Random(0)
+    
+    # The nodes print diagnostics such as failed sends; keep stdout for the JSON results alone
+    results_out, sys.stdout = sys.stdout, sys.stderr
+    cluster = Cluster(args.peers, home, args.debounce, args.deadline)
+    try:
+        results = {
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "peers": args.peers,
+                "debounce_window": cluster.sender.network.debounce_window,
+                "send_deadline": args.deadline
+            },
+            "latency": bench_latency(cluster, args.rounds, rng),
+            "throughput": bench_throughput(cluster, [size for size in SIZES if size <= args.max_size], rng),
+            "fanout": bench_fanout(cluster, 64 * 1024, max(3, args.rounds // 5), rng),
+            "sender": {
+                "compression": cluster.sender.network.compression_totals,
+                "delta": cluster.sender.network.delta_stats,
+                "queue": cluster.sender.network.queue_stats,
+                "pool": cluster.sender.network.connection_pool.stats()
+            }
+        }
+    finally:
+        cluster.stop()
+        sys.stdout = results_out
+        
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
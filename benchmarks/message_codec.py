@@ -0,0 +1,79 @@
+"""Compare the JSON and binary Message codecs.
+
+Run from the repository root:
+
+    python -m benchmarks.message_codec
+"""
+import json
+import sys
+import time
+import tracemalloc
+from message import Message, MessageType
+
+SIZES = [1024, 100 * 1024, 10 * 1024 * 1024]
+
+def make_text(size):
+    # Quotes, backslashes and newlines are what makes JSON escaping expensive
+    line = 'path = "C:\\\\Users\\\\dev\\\\file.txt"; print("done")\n'
+    return (line * (size // len(line) + 1))[:size]
+
+def encode_json(text):
+    msg = Message(MessageType.CLIPBOARD_DATA, {"text": text}, "192.168.1.10", "bench")
+    return msg.to_json().encode("utf-8")
+
+def decode_json(data):
+    return Message.from_json(data).text
+
+def encode_binary(text):
+    msg = Message(MessageType.CLIPBOARD_DATA, {}, "192.168.1.10", "bench", text.encode("utf-8"))
+    return b"".join(msg.to_bytes())
+
+def decode_binary(data):
+    return Message.from_bytes(data).text
+
+def measure(func, arg, size):
+    iterations = max(3, min(2000, (50 * 1024 * 1024) // size))
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    elapsed = time.perf_counter() - started
+    
+    tracemalloc.start()
+    blocks_before = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    result = func(arg)
+    current, peak = tracemalloc.get_traced_memory()
+    blocks_after = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    del result
+    
+    return {
+        "ops_per_sec": iterations / elapsed,
+        "mb_per_sec": iterations * size / elapsed / (1024 * 1024),
+        "peak_bytes": peak,
+        "peak_to_payload": peak / size,
+        "retained_blocks": blocks_after - blocks_before
+    }
+
+def main():
+    results = []
+    for size in SIZES:
+        text = make_text(size)
+        json_data = encode_json(text)
+        binary_data = encode_binary(text)
+        for codec, encode, decode, data in (
+            ("json", encode_json, decode_json, json_data),
+            ("binary", encode_binary, decode_binary, binary_data)
+        ):
+            results.append({
+                "codec": codec,
+                "payload_bytes": size,
+                "wire_bytes": len(data),
+                "encode": measure(encode, text, size),
+                "decode": measure(decode, data, size)
+            })
+            
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
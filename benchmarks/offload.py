@@ -0,0 +1,104 @@
+"""Event loop responsiveness while large payloads are hashed, compressed and decompressed.
+
+A ticker task wakes every millisecond on the same loop that processes the payload; how late it
+wakes up is how long discovery replies and other transfers would have waited. Each round hashes,
+compresses and decompresses one payload of compressible text through PayloadProcessor.
+
+Modes:
+  inline    everything on the event loop, as before payloads were offloaded
+  threaded  large payloads on a thread, the fallback when worker processes are unavailable
+  offload   large payloads in worker processes, passed through shared memory
+
+Run from the repository root:
+
+    python -m benchmarks.offload --size 52428800 --rounds 3
+
+Results are printed as JSON so runs from different versions can be compared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from clipboard import TEXT_PLAIN
+from offload import PayloadProcessor
+
+MODES = ["inline", "threaded", "offload"]
+CODECS = ["zlib"]
+TICK = 0.001
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def make_payload(size):
+    words = [os.urandom(random.randint(2, 6)).hex() for _ in range(2000)]
+    text = " ".join(random.choice(words) for _ in range(size // 8))
+    return text.encode("ascii")[:size]
+
+def make_processor(mode):
+    if mode == "inline":
+        return PayloadProcessor(min_size=float("inf"))
+    processor = PayloadProcessor()
+    processor.disabled = mode == "threaded"
+    return processor
+
+async def process(processor, payload):
+    digest = await processor.digest({TEXT_PLAIN: payload})
+    codec, compressed, stats = await processor.compress(payload, CODECS)
+    restored = await processor.decompress(compressed, codec, len(payload))
+    assert restored == payload and digest
+    return stats.wire_size
+
+async def measure(mode, payload, rounds):
+    processor = make_processor(mode)
+    # Worker processes start with the first large payload; keep that out of the timed rounds
+    await process(processor, payload)
+    lags = []
+    stop = asyncio.Event()
+    
+    async def tick():
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - started - TICK)
+            
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        wire_size = await process(processor, payload)
+        # Inline rounds never give the loop a turn otherwise; each payload would arrive separately
+        await asyncio.sleep(TICK * 2)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    processor.close()
+    return {
+        "mode": mode,
+        "payload_bytes": len(payload),
+        "wire_bytes": wire_size,
+        "seconds_per_round": elapsed / rounds,
+        "loop_lag": {"p50": percentile(lags, 0.5), "p99": percentile(lags, 0.99), "max": max(lags)},
+        "processor": processor.stats
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=50 * 1024 * 1024, help="payload bytes")
+    parser.add_argument("--rounds", type=int, default=3, help="payloads processed per mode")
+    args = parser.parse_args()
+    
+    random.seed(0)
+    payload = make_payload(args.size)
+    results = {"environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}}
+    results["modes"] = [asyncio.run(measure(mode, payload, args.rounds)) for mode in MODES]
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Import cost and cold-start time of the GUI and headless entry points.
+
+Each measurement runs in a fresh interpreter. Import cost is taken from `python -X importtime`;
+cold start is the time from spawning the process until it is ready to sync, meaning the network
+servers are listening and (for the GUI) the window has been created. The GUI start needs a
+display and is reported as unavailable without one.
+
+Run from the repository root:
+
+    python -m benchmarks.startup --runs 5
+
+Results are printed as JSON so runs from different versions can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORTS = {
+    "gui": "import device_manager, network, ui",
+    "headless": "import headless"
+}
+
+# Mirrors the two branches of main.py up to the point where they are ready to sync
+STARTS = {
+    "gui": (
+        "from device_manager import DeviceManager\n"
+        "from network import NetworkManager\n"
+        "from ui import ClipboardSyncUI\n"
+        "device_manager = DeviceManager()\n"
+        "network_manager = NetworkManager(device_manager, bind_ip='127.0.0.1')\n"
+        "network_manager.start()\n"
+        "ui = ClipboardSyncUI(device_manager, network_manager)\n"
+        "ui.root.update()\n"
+        "print('Ready to sync', flush=True)\n"
+    ),
+    "headless": "import sys; sys.argv = ['main.py', '--headless', '--bind', '127.0.0.1']; exec(open('main.py').read())"
+}
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(values):
+    return {"runs": len(values), "min": min(values), "p50": percentile(values, 0.5), "max": max(values)}
+
+def environment(home):
+    # A fresh HOME keeps paired devices and history out of the way, and the fake clipboard
+    # takes the speed of the system clipboard out of the measurement
+    return dict(os.environ, HOME=home, CLIPBOARDSYNC_BACKEND="fake")
+
+def measure_imports(statement, runs, env):
+    totals, modules = [], None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement + "; import sys; print(len(sys.modules), 'tkinter' in sys.modules)"],
+            env=env, capture_output=True, text=True, check=True
+        )
+        # Top-level imports are the lines without indentation in the package column
+        total = 0
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:") and not line.split("|")[2].startswith("  ") and line.split("|")[1].strip().isdigit():
+                total += int(line.split("|")[1])
+        totals.append(total / 1e6)
+        count, tkinter = result.stdout.split()
+        modules = {"modules_loaded": int(count), "tkinter_loaded": tkinter == "True"}
+    return dict(summarize(totals), **modules)
+
+def measure_start(code, runs, env, timeout=30):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-c", code],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        try:
+            for line in process.stdout:
+                if line.startswith("Ready to sync"):
+                    times.append(time.perf_counter() - started)
+                    break
+            else:
+                return {"error": process.stderr.read().strip().splitlines()[-1:] or "exited before it was ready"}
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return summarize(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    args = parser.parse_args()
+    
+    env = environment(tempfile.mkdtemp(prefix="clipboardsync-startup-"))
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "display": bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY") or sys.platform in ("win32", "darwin"))
+        },
+        "interpreter_seconds": measure_start("print('Ready to sync', flush=True)", args.runs, env)
+    }
+    for name in ("gui", "headless"):
+        results[name] = {
+            "import_seconds": measure_imports(IMPORTS[name], args.runs, env),
+            "ready_seconds": measure_start(STARTS[name], args.runs, env)
+        }
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
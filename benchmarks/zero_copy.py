@@ -0,0 +1,159 @@
+"""Memory copies and peak RSS of sending and receiving one large frame.
+
+Each mode runs in a fresh worker process, with the other end of the connection in a second
+process so it does not pollute the measurement. Python allocations are traced while the frame
+is in flight; "copies" is the traced peak divided by the payload size. A sender starts with the
+payload already in memory, so 0 means it was never duplicated; a receiver has to hold the payload
+once, so 1 is the floor there.
+
+Receive modes:
+  stream    asyncio StreamReader.readexactly, the path used before FrameConnection
+  buffered  FrameConnection, which receives with recv_into into one preallocated buffer
+Send modes:
+  writelines  StreamWriter.writelines, which joins the header and payload into a new buffer
+  chunked     write_frame with an in-memory payload, written in memoryview slices
+  sendfile    write_frame with a SpoolFile, sent by the kernel from the staged file
+
+Run from the repository root:
+
+    python -m benchmarks.zero_copy --size 52428800
+
+Results are printed as JSON so runs from different versions can be compared.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from framing import SpoolFile, encode_frame_header, read_frame, start_frame_server, write_frame
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RECEIVE_MODES = ["stream", "buffered"]
+SEND_MODES = ["writelines", "chunked", "sendfile"]
+
+# Runs in the peer process: send one frame of the given size to a port, or accept and discard one
+SEND_PEER = """
+import asyncio, sys
+from framing import write_frame
+async def send():
+    _, writer = await asyncio.open_connection("127.0.0.1", int(sys.argv[1]))
+    await write_frame(writer, bytes(int(sys.argv[2])), max_size=int(sys.argv[2]))
+    writer.close()
+    await writer.wait_closed()
+asyncio.run(send())
+"""
+SINK_PEER = """
+import socket
+server = socket.create_server(("127.0.0.1", 0))
+print(server.getsockname()[1], flush=True)
+sock, _ = server.accept()
+buffer = bytearray(1024 * 1024)
+while sock.recv_into(buffer):
+    pass
+"""
+
+def peak_rss():
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+async def receive(mode, size):
+    done = asyncio.get_running_loop().create_future()
+    
+    async def on_stream(reader, writer):
+        frame = await read_frame(reader, size)
+        writer.close()
+        done.set_result(frame)
+        
+    async def on_connection(connection):
+        frame = await connection.read_frame()
+        connection.close()
+        done.set_result(frame)
+        
+    if mode == "stream":
+        server = await asyncio.start_server(on_stream, "127.0.0.1", 0)
+    else:
+        server = await start_frame_server(on_connection, "127.0.0.1", 0, size)
+    port = server.sockets[0].getsockname()[1]
+    tracemalloc.start()
+    started = time.perf_counter()
+    peer = await asyncio.create_subprocess_exec(sys.executable, "-c", SEND_PEER, str(port), str(size))
+    flags, payload = await done
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await peer.wait()
+    server.close()
+    assert len(payload) == size
+    return elapsed, peak
+
+async def send(mode, size):
+    payload = bytes(size)
+    if mode == "sendfile":
+        payload = SpoolFile([payload])
+    peer = await asyncio.create_subprocess_exec(sys.executable, "-c", SINK_PEER, stdout=subprocess.PIPE)
+    port = int(await peer.stdout.readline())
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    tracemalloc.start()
+    started = time.perf_counter()
+    if mode == "writelines":
+        writer.writelines([encode_frame_header(size), payload])
+        await writer.drain()
+    else:
+        await write_frame(writer, payload, max_size=size)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    writer.close()
+    await peer.wait()
+    return elapsed, peak
+
+def run_worker(mode, size):
+    rss_before = peak_rss()
+    coroutine = receive(mode, size) if mode in RECEIVE_MODES else send(mode, size)
+    elapsed, traced_peak = asyncio.run(coroutine)
+    return {
+        "mode": mode,
+        "payload_bytes": size,
+        "seconds": elapsed,
+        "mb_per_sec": size / elapsed / (1024 * 1024),
+        "traced_peak_bytes": traced_peak,
+        "copies": round(traced_peak / size, 2),
+        "peak_rss_bytes": peak_rss(),
+        "rss_growth_bytes": peak_rss() - rss_before if resource else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=50 * 1024 * 1024, help="payload bytes per frame")
+    parser.add_argument("--worker", choices=RECEIVE_MODES + SEND_MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        json.dump(run_worker(args.worker, args.size), sys.stdout)
+        return
+        
+    results = {"environment": {"python": platform.python_version(), "platform": platform.platform()}}
+    for direction, modes in (("receive", RECEIVE_MODES), ("send", SEND_MODES)):
+        results[direction] = []
+        for mode in modes:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.zero_copy", "--worker", mode, "--size", str(args.size)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            results[direction].append(json.loads(output))
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
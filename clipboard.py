@@ -0,0 +1,580 @@
+import hashlib
+import os
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from config import CLIPBOARD_BACKEND, POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, POLL_BACKOFF, COUNTER_POLL_INTERVAL
+from config import CLIPBOARD_HELPER_TIMEOUT
+import clipboard_helper
+from metrics import CLIPBOARD_POLL
+
+# MIME types a clipboard item can carry. Plain text is understood by every peer; others are
+# only sent to peers that advertise them as "format:<mime type>" capabilities.
+TEXT_PLAIN = "text/plain"
+TEXT_HTML = "text/html"
+IMAGE_PNG = "image/png"
+URI_LIST = "text/uri-list"
+RICH_FORMATS = (TEXT_HTML, IMAGE_PNG, URI_LIST)
+
+def content_digest(text):
+    """Cheap fixed-size fingerprint used to detect clipboard changes"""
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    return hashlib.blake2b(text, digest_size=16).hexdigest()
+
+def item_digest(formats):
+    """Fingerprint of every representation in formats (MIME type -> body)"""
+    if set(formats) == {TEXT_PLAIN}:
+        # Same as content_digest(text), so text items keep matching history and delta versions
+        return content_digest(formats[TEXT_PLAIN])
+    hasher = hashlib.blake2b(digest_size=16)
+    for mime in sorted(formats):
+        body = formats[mime]
+        hasher.update(f"{mime}:{len(body)}:".encode("ascii"))
+        hasher.update(body)
+    return hasher.hexdigest()
+
+def format_capabilities(formats):
+    return ["format:" + mime for mime in formats if mime != TEXT_PLAIN]
+
+def accepted_formats(capabilities):
+    """MIME types a peer accepts, from the capabilities it advertised"""
+    return {TEXT_PLAIN} | {capability[7:] for capability in capabilities if capability.startswith("format:")}
+
+class ClipboardItem:
+    """One clipboard entry as MIME-typed representations of the same content"""
+    __slots__ = ("formats", "origin", "clock", "_digest")
+    
+    def __init__(self, formats, origin=None, clock=0):
+        self.formats = formats  # MIME type -> bytes-like body
+        self.origin = origin  # id of the device it was copied on, once stamped for sync
+        self.clock = clock  # origin's Lamport clock when it was copied
+        self._digest = None
+        
+    @classmethod
+    def from_text(cls, text):
+        return cls({TEXT_PLAIN: text.encode("utf-8")})
+        
+    @property
+    def text(self):
+        body = self.formats.get(TEXT_PLAIN)
+        return None if body is None else str(body, "utf-8")
+        
+    @property
+    def size(self):
+        return sum(len(body) for body in self.formats.values())
+        
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = item_digest(self.formats)
+        return self._digest
+        
+    @digest.setter
+    def digest(self, value):
+        # For digests computed elsewhere, for example in a worker process
+        self._digest = value
+        
+    def filtered(self, accepted):
+        """The representations a peer accepting these MIME types can use, or None if there are none"""
+        formats = {mime: body for mime, body in self.formats.items() if mime in accepted}
+        if len(formats) == len(self.formats):
+            return self
+        return ClipboardItem(formats, self.origin, self.clock) if formats else None
+
+class ClipboardBackendError(Exception):
+    pass
+
+class ClipboardBackend:
+    """Reads and writes the system clipboard and optionally signals when it changes"""
+    name = "base"
+    supports_notifications = False
+    formats = (TEXT_PLAIN,)  # MIME types paste_item and copy_item can carry
+    
+    def paste(self):
+        raise NotImplementedError
+        
+    def copy(self, text):
+        raise NotImplementedError
+        
+    def paste_item(self):
+        """Read every supported representation of the clipboard, or None when it is empty"""
+        text = self.paste()
+        return ClipboardItem.from_text(text) if text else None
+        
+    def copy_item(self, item):
+        text = item.text
+        if text is not None:
+            self.copy(text)
+            
+    def stored_item(self, item):
+        """The part of item that copy_item writes, which is what paste_item reads back, or None"""
+        return item.filtered(self.formats)
+        
+    def wait_for_change(self, timeout):
+        """Block until the clipboard changed or timeout expired, returning True on a change"""
+        raise NotImplementedError
+        
+    def close(self):
+        pass
+
+class ClipboardHelper:
+    """Client for clipboard_helper.py: one long-lived process reused for every paste and copy
+    
+    A helper that dies or stops answering is restarted once per request before giving up.
+    """
+    
+    def __init__(self, fake=False, timeout=CLIPBOARD_HELPER_TIMEOUT):
+        if getattr(sys, "frozen", False):
+            # sys.executable is the bundled app itself, which main.py turns into the helper
+            self.command = [sys.executable, "--clipboard-helper"]
+        else:
+            self.command = [sys.executable, clipboard_helper.__file__]
+        self.command += ["--fake"] if fake else []
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.process = None
+        self.starts = 0
+        # Fails here, rather than on first use, when the helper cannot reach a clipboard
+        self.paste()
+        
+    def _start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        self.starts += 1
+        
+    def _read(self, size):
+        data = bytearray()
+        while len(data) < size:
+            readable, _, _ = select.select([self.process.stdout], [], [], self.timeout)
+            if not readable:
+                raise ClipboardBackendError("Clipboard helper did not answer")
+            chunk = os.read(self.process.stdout.fileno(), size - len(data))
+            if not chunk:
+                raise ClipboardBackendError("Clipboard helper exited")
+            data += chunk
+        return bytes(data)
+        
+    def _request(self, op, body=b""):
+        with self.lock:
+            for attempt in range(2):
+                if self.process is None or self.process.poll() is not None:
+                    self._start()
+                try:
+                    self.process.stdin.write(clipboard_helper.HEADER.pack(op, len(body)) + body)
+                    status, length = clipboard_helper.HEADER.unpack(self._read(clipboard_helper.HEADER.size))
+                    reply = self._read(length) if length else b""
+                except (OSError, ClipboardBackendError) as e:
+                    error = e
+                    self.process.kill()
+                    self.process = None
+                    continue
+                if status != clipboard_helper.OK:
+                    raise ClipboardBackendError(f"Clipboard helper error: {reply.decode('utf-8', 'replace')}")
+                return reply
+            raise ClipboardBackendError(f"Clipboard helper unavailable: {error}")
+            
+    def paste(self):
+        return self._request(clipboard_helper.PASTE).decode("utf-8")
+        
+    def copy(self, text):
+        self._request(clipboard_helper.COPY, text.encode("utf-8"))
+        
+    def targets(self):
+        """The selection targets (MIME types and X11 atoms) the clipboard owner offers"""
+        return self._request(clipboard_helper.TARGETS).decode("utf-8").split()
+        
+    def close(self):
+        with self.lock:
+            if self.process:
+                self.process.stdin.close()
+                try:
+                    self.process.wait(1)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                self.process = None
+
+def start_clipboard_helper():
+    """Start the persistent helper, or return None when it cannot reach the clipboard"""
+    try:
+        return ClipboardHelper()
+    except (ClipboardBackendError, OSError) as e:
+        print(f"{e}; using pyperclip")
+        return None
+
+class PyperclipBackend(ClipboardBackend):
+    name = "pyperclip"
+    
+    def __init__(self, helper=None):
+        # Imported here so that choosing another backend never loads pyperclip
+        import pyperclip
+        self.pyperclip = pyperclip
+        # On X11 pyperclip forks xclip or xsel for every call; a persistent helper replaces that
+        self.helper = helper
+        if helper:
+            self.name += "+helper"
+            
+    def _helper_failed(self, error):
+        print(f"Clipboard helper stopped, falling back to pyperclip: {error}")
+        self.helper.close()
+        self.helper = None
+        
+    def paste(self):
+        if self.helper:
+            try:
+                return self.helper.paste()
+            except ClipboardBackendError as e:
+                self._helper_failed(e)
+        return self.pyperclip.paste()
+        
+    def copy(self, text):
+        if self.helper:
+            try:
+                return self.helper.copy(text)
+            except ClipboardBackendError as e:
+                self._helper_failed(e)
+        self.pyperclip.copy(text)
+        
+    def close(self):
+        if self.helper:
+            self.helper.close()
+
+class CounterBackend(PyperclipBackend):
+    """Watches a change counter kept by the OS, so the clipboard is only read when it changed"""
+    supports_notifications = True
+    
+    def __init__(self):
+        super().__init__()
+        self.last_count = self._change_count()
+        
+    def _change_count(self):
+        raise NotImplementedError
+        
+    def wait_for_change(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            count = self._change_count()
+            if count != self.last_count:
+                self.last_count = count
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(COUNTER_POLL_INTERVAL, remaining))
+
+class WindowsSequenceBackend(CounterBackend):
+    name = "win32-sequence"
+    
+    def __init__(self):
+        import ctypes
+        self.user32 = ctypes.windll.user32
+        super().__init__()
+        
+    def _change_count(self):
+        return self.user32.GetClipboardSequenceNumber()
+
+class MacChangeCountBackend(CounterBackend):
+    name = "nspasteboard"
+    formats = (TEXT_PLAIN, TEXT_HTML, IMAGE_PNG)
+    PASTEBOARD_TYPES = {TEXT_HTML: "public.html", IMAGE_PNG: "public.png"}
+    
+    def __init__(self):
+        from AppKit import NSPasteboard
+        from Foundation import NSData
+        self.pasteboard = NSPasteboard.generalPasteboard()
+        self.NSData = NSData
+        super().__init__()
+        
+    def _change_count(self):
+        return self.pasteboard.changeCount()
+        
+    def paste(self):
+        # Straight from the pasteboard already held open, rather than through pyperclip
+        text = self.pasteboard.stringForType_("public.utf8-plain-text")
+        return str(text) if text is not None else ""
+        
+    def copy(self, text):
+        self.pasteboard.clearContents()
+        self.pasteboard.setString_forType_(text, "public.utf8-plain-text")
+        
+    def paste_item(self):
+        formats = {}
+        text = self.pasteboard.stringForType_("public.utf8-plain-text")
+        if text:
+            formats[TEXT_PLAIN] = str(text).encode("utf-8")
+        for mime, pasteboard_type in self.PASTEBOARD_TYPES.items():
+            data = self.pasteboard.dataForType_(pasteboard_type)
+            if data is not None:
+                formats[mime] = bytes(data)
+        return ClipboardItem(formats) if formats else None
+        
+    def copy_item(self, item):
+        self.pasteboard.clearContents()
+        for mime, body in item.formats.items():
+            if mime == TEXT_PLAIN:
+                self.pasteboard.setString_forType_(str(body, "utf-8"), "public.utf8-plain-text")
+            elif mime in self.PASTEBOARD_TYPES:
+                data = self.NSData.dataWithBytes_length_(bytes(body), len(body))
+                self.pasteboard.setData_forType_(data, self.PASTEBOARD_TYPES[mime])
+
+class CommandFormats:
+    """Reads and writes one non-text format through a clipboard command line tool
+    
+    wl-copy and xclip can only offer one format per call, so an image is copied on its own
+    and text goes through pyperclip as before.
+    """
+    
+    def __init__(self, list_command, paste_command, copy_command):
+        self.list_command = list_command
+        self.paste_command = paste_command  # followed by the MIME type
+        self.copy_command = copy_command  # followed by the MIME type, reads the body from stdin
+        
+    def paste(self, formats, offered=None):
+        """Return (whether text is on offer, {mime: body} for the requested formats on offer)
+        
+        offered is the list of targets when the caller already has it, saving a call to list_command.
+        """
+        result = {}
+        if offered is None:
+            offered = subprocess.run(self.list_command, capture_output=True, timeout=5).stdout.decode("utf-8", "replace").split()
+        has_text = any(target.startswith(TEXT_PLAIN) or target in ("UTF8_STRING", "STRING", "TEXT") for target in offered)
+        for mime in formats:
+            if mime in offered:
+                result[mime] = subprocess.run(self.paste_command + [mime], capture_output=True, timeout=5, check=True).stdout
+        return has_text, result
+        
+    def copy(self, mime, body):
+        subprocess.run(self.copy_command + [mime], input=body, timeout=5, check=True)
+
+class CommandFormatsMixin:
+    """Adds images to a pyperclip-based backend when a CommandFormats helper is available"""
+    rich = None
+    
+    def _offered(self):
+        """Targets listed by the persistent helper, or None to fork the list command instead"""
+        if self.helper:
+            try:
+                return self.helper.targets()
+            except ClipboardBackendError as e:
+                self._helper_failed(e)
+        return None
+        
+    def paste_item(self):
+        item = super().paste_item()
+        if not self.rich:
+            return item
+        # A plain text copy then costs no fork at all; the format itself is only fetched when on offer
+        has_text, rich_formats = self.rich.paste([IMAGE_PNG], self._offered())
+        # Without a text target the tools fall back to dumping the image bytes as "text"
+        formats = dict(item.formats) if item and has_text else {}
+        formats.update(rich_formats)
+        return ClipboardItem(formats) if formats else None
+        
+    def copy_item(self, item):
+        if self.rich and IMAGE_PNG in item.formats:
+            self.rich.copy(IMAGE_PNG, item.formats[IMAGE_PNG])
+        else:
+            super().copy_item(item)
+            
+    def stored_item(self, item):
+        # The image replaces any text that came with it
+        if self.rich and IMAGE_PNG in item.formats:
+            return item.filtered((IMAGE_PNG,))
+        return super().stored_item(item)
+
+class WaylandWatchBackend(CommandFormatsMixin, PyperclipBackend):
+    """Uses one long-running `wl-paste --watch` process that prints a line on every change"""
+    name = "wl-paste-watch"
+    supports_notifications = True
+    
+    def __init__(self):
+        super().__init__()
+        if shutil.which("wl-copy"):
+            self.formats = (TEXT_PLAIN, IMAGE_PNG)
+            self.rich = CommandFormats(["wl-paste", "--list-types"], ["wl-paste", "--no-newline", "--type"], ["wl-copy", "--type"])
+        self.process = subprocess.Popen(
+            ["wl-paste", "--watch", "echo"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+        
+    def wait_for_change(self, timeout):
+        readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not readable:
+            return False
+        if not os.read(self.process.stdout.fileno(), 4096):
+            raise ClipboardBackendError("wl-paste --watch exited")
+        return True
+        
+    def close(self):
+        self.process.terminate()
+        super().close()
+
+class ClipnotifyBackend(CommandFormatsMixin, PyperclipBackend):
+    """Uses the X11 `clipnotify` tool, which blocks until the selection changes and then exits"""
+    name = "clipnotify"
+    supports_notifications = True
+    
+    def __init__(self, helper=None):
+        super().__init__(helper)
+        if shutil.which("xclip"):
+            self.formats = (TEXT_PLAIN, IMAGE_PNG)
+            xclip = ["xclip", "-selection", "clipboard"]
+            self.rich = CommandFormats(xclip + ["-o", "-t", "TARGETS"], xclip + ["-o", "-t"], xclip + ["-i", "-t"])
+        self.process = None
+        
+    def wait_for_change(self, timeout):
+        if self.process is None:
+            self.process = subprocess.Popen(["clipnotify"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            returncode = self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        self.process = None
+        if returncode != 0:
+            raise ClipboardBackendError(f"clipnotify exited with status {returncode}")
+        return True
+        
+    def close(self):
+        if self.process:
+            self.process.terminate()
+        super().close()
+
+class FakeClipboard(ClipboardBackend):
+    """In-memory clipboard for tests and benchmarks"""
+    name = "fake"
+    supports_notifications = True
+    formats = (TEXT_PLAIN,) + RICH_FORMATS
+    
+    def __init__(self, text=""):
+        self.text = text
+        self.item = ClipboardItem.from_text(text) if text else None
+        self.change_count = 0
+        self.seen_count = 0
+        self.paste_count = 0
+        self.copy_count = 0
+        self.condition = threading.Condition()
+        
+    def paste(self):
+        with self.condition:
+            self.paste_count += 1
+            return self.text
+            
+    def copy(self, text):
+        self.copy_item(ClipboardItem.from_text(text))
+        
+    def paste_item(self):
+        with self.condition:
+            self.paste_count += 1
+            return self.item
+            
+    def copy_item(self, item):
+        with self.condition:
+            self.copy_count += 1
+            self.item = item
+            self.text = item.text or ""
+            self.change_count += 1
+            self.condition.notify_all()
+            
+    def wait_for_change(self, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.change_count != self.seen_count, timeout)
+            changed = self.change_count != self.seen_count
+            self.seen_count = self.change_count
+            return changed
+
+def create_clipboard_backend(name=None):
+    """Pick the cheapest clipboard backend available on this machine"""
+    name = name or os.environ.get("CLIPBOARDSYNC_BACKEND") or CLIPBOARD_BACKEND
+    if name == "fake":
+        return FakeClipboard()
+    if name == "pyperclip":
+        return PyperclipBackend()
+    if name == "helper":
+        return PyperclipBackend(start_clipboard_helper())
+        
+    try:
+        if sys.platform == "win32":
+            return WindowsSequenceBackend()
+        if sys.platform == "darwin":
+            return MacChangeCountBackend()
+        if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-paste"):
+            return WaylandWatchBackend()
+        if os.environ.get("DISPLAY"):
+            helper = start_clipboard_helper()
+            if shutil.which("clipnotify"):
+                return ClipnotifyBackend(helper)
+            return PyperclipBackend(helper)
+    except (ImportError, OSError, AttributeError) as e:
+        print(f"Clipboard change notifications unavailable, falling back to polling: {e}")
+    return PyperclipBackend()
+
+class ClipboardWatcher:
+    """Calls callback(item) with a ClipboardItem whenever the clipboard content changes"""
+    
+    def __init__(self, backend, callback, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL):
+        self.backend = backend
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.use_notifications = backend.supports_notifications
+        self.last_digest = None
+        self.running = False
+        self.stop_event = threading.Event()
+        self.thread = None
+        
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        self.backend.close()
+        
+    def _run(self):
+        # Take the current content as the baseline so startup does not broadcast it; reading it here
+        # keeps a slow clipboard from delaying startup
+        self._check(notify=False)
+        while self.running:
+            if self.use_notifications:
+                try:
+                    if not self.backend.wait_for_change(self.max_interval):
+                        continue
+                except ClipboardBackendError as e:
+                    print(f"Clipboard notifications stopped, falling back to polling: {e}")
+                    self.use_notifications = False
+                    continue
+            elif self.stop_event.wait(self.interval):
+                return
+                
+            changed = self._check()
+            if not self.use_notifications:
+                # Poll quickly right after activity and back off while the clipboard is idle
+                self.interval = self.min_interval if changed else min(self.interval * POLL_BACKOFF, self.max_interval)
+                
+    def _check(self, notify=True):
+        started = time.perf_counter()
+        try:
+            item = self.backend.paste_item()
+        except Exception as e:
+            print(f"Error reading clipboard: {e}")
+            return False
+            
+        digest = item.digest if item else None
+        CLIPBOARD_POLL.observe(time.perf_counter() - started)
+        if not item or digest == self.last_digest:
+            return False
+            
+        self.last_digest = digest
+        if notify and self.running:
+            try:
+                self.callback(item)
+            except Exception as e:
+                print(f"Clipboard change handler error: {e}")
+        return True
@@ -0,0 +1,140 @@
+"""Long-lived clipboard helper process.
+
+Holds one connection to the X11 clipboard through Tk and serves paste and copy requests from
+its parent over stdin and stdout, so reading or writing the clipboard never forks xclip or xsel.
+While it runs it also owns whatever was copied last, which xclip otherwise forks a daemon for.
+
+Requests and replies are an op byte, a 4 byte big-endian length and that many bytes of UTF-8.
+
+    python clipboard_helper.py          # serve the X11 clipboard
+    python clipboard_helper.py --fake   # serve an in-memory clipboard, for benchmarks
+    
+A bundled app has no script to run, so it starts itself with --clipboard-helper and main.py calls main().
+"""
+import os
+import struct
+import sys
+
+HEADER = struct.Struct("!cI")
+PASTE = b"P"
+COPY = b"C"
+TARGETS = b"T"  # replies with the targets on offer, separated by newlines
+OK = b"O"
+ERROR = b"E"
+
+def read_exactly(fd, size):
+    """Read size bytes from fd, or return None if it closed before the first byte"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            if not data:
+                return None
+            raise EOFError(f"Stream closed after {len(data)} of {size} bytes")
+        data += chunk
+    return bytes(data)
+
+def read_message(fd):
+    header = read_exactly(fd, HEADER.size)
+    if header is None:
+        return None
+    op, length = HEADER.unpack(header)
+    return op, read_exactly(fd, length) if length else b""
+
+def write_message(fd, op, body=b""):
+    data = memoryview(HEADER.pack(op, len(body)) + body)
+    while data:
+        data = data[os.write(fd, data):]
+
+class MemoryClipboard:
+    def __init__(self):
+        self.text = ""
+        
+    def get(self):
+        return self.text
+        
+    def set(self, text):
+        self.text = text
+        
+    def targets(self):
+        return ["UTF8_STRING", "text/plain;charset=utf-8"] if self.text else []
+
+class TkClipboard:
+    def __init__(self):
+        import tkinter
+        self.tkinter = tkinter
+        self.root = tkinter.Tk()
+        self.root.withdraw()
+        
+    def get(self):
+        for selection_type in ("UTF8_STRING", "STRING"):
+            try:
+                return self.root.clipboard_get(type=selection_type)
+            except self.tkinter.TclError:
+                # Empty, or holding something that is not text in this encoding
+                continue
+        return ""
+        
+    def set(self, text):
+        self.root.clipboard_clear()
+        self.root.clipboard_append(text)
+        # Take ownership of the selection now rather than on the next idle pass
+        self.root.update()
+        
+    def targets(self):
+        try:
+            offered = self.root.selection_get(selection="CLIPBOARD", type="TARGETS")
+        except self.tkinter.TclError:
+            # Nobody owns the clipboard
+            return []
+        return list(self.root.tk.splitlist(offered))
+
+def handle(clipboard, op, body):
+    try:
+        if op == PASTE:
+            return OK, clipboard.get().encode("utf-8")
+        if op == COPY:
+            clipboard.set(body.decode("utf-8"))
+            return OK, b""
+        if op == TARGETS:
+            return OK, "\n".join(clipboard.targets()).encode("utf-8")
+        return ERROR, f"Unknown op {op!r}".encode("utf-8")
+    except Exception as e:
+        return ERROR, str(e).encode("utf-8")
+
+def serve(clipboard, stdin, stdout):
+    while True:
+        request = read_message(stdin)
+        if request is None:
+            return
+        write_message(stdout, *handle(clipboard, *request))
+
+def serve_tk(stdin, stdout):
+    clipboard = TkClipboard()
+    
+    def on_request(fd, mask):
+        request = read_message(stdin)
+        if request is None:
+            clipboard.root.quit()
+            return
+        write_message(stdout, *handle(clipboard, *request))
+        
+    # Requests are handled from the Tk event loop, which must keep running to answer other
+    # applications pasting what we copied
+    clipboard.root.createfilehandler(stdin, clipboard.tkinter.READABLE, on_request)
+    clipboard.root.mainloop()
+
+def main(argv):
+    # Replies go to the original stdout; stray prints from Tk or Python go to stderr instead
+    stdin, stdout = sys.stdin.fileno(), os.dup(sys.stdout.fileno())
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    try:
+        if "--fake" in argv:
+            serve(MemoryClipboard(), stdin, stdout)
+        else:
+            serve_tk(stdin, stdout)
+    except (EOFError, BrokenPipeError, KeyboardInterrupt):
+        pass
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,120 @@
+import time
+import zlib
+from config import COMPRESSION_THRESHOLD, COMPRESSION_MAX_RATIO, COMPRESSION_SAMPLE_SIZE
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codec ids are carried in the low bits of the frame flags
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_MASK = 0x03
+
+CODEC_NAMES = {
+    CODEC_NONE: "none",
+    CODEC_ZLIB: "zlib",
+    CODEC_ZSTD: "zstd"
+}
+
+def supported_codecs():
+    """Codec names this device can decode, advertised to peers"""
+    codecs = ["zlib"]
+    if zstandard:
+        codecs.insert(0, "zstd")
+    return codecs
+
+class CompressionStats:
+    def __init__(self, codec, original_size, wire_size, cpu_time):
+        self.codec = codec
+        self.original_size = original_size
+        self.wire_size = wire_size
+        self.cpu_time = cpu_time  # seconds of CPU spent compressing
+        
+    @property
+    def bytes_saved(self):
+        return self.original_size - self.wire_size
+        
+    def to_dict(self):
+        return {
+            "codec": CODEC_NAMES[self.codec],
+            "original_size": self.original_size,
+            "wire_size": self.wire_size,
+            "bytes_saved": self.bytes_saved,
+            "cpu_time": self.cpu_time
+        }
+
+def choose_codec(size, peer_codecs):
+    """Pick a codec and level for a payload of the given size, or (CODEC_NONE, 0) to skip compression"""
+    if size < COMPRESSION_THRESHOLD or not peer_codecs:
+        return CODEC_NONE, 0
+    if zstandard and "zstd" in peer_codecs:
+        # zstd stays fast at higher levels, so only drop the level for very large payloads
+        return CODEC_ZSTD, 9 if size < 1024 * 1024 else 3
+    if "zlib" in peer_codecs:
+        # On a LAN the link is fast, so large payloads favour speed over ratio
+        if size < 256 * 1024:
+            return CODEC_ZLIB, 6
+        if size < 8 * 1024 * 1024:
+            return CODEC_ZLIB, 3
+        return CODEC_ZLIB, 1
+    return CODEC_NONE, 0
+
+def _compress(data, codec, level):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+def _looks_incompressible(data):
+    """Compress a leading sample cheaply to spot data that is already compressed or random"""
+    if len(data) <= COMPRESSION_SAMPLE_SIZE * 2:
+        return False
+    sample = bytes(memoryview(data)[:COMPRESSION_SAMPLE_SIZE])
+    return len(zlib.compress(sample, 1)) > len(sample) * COMPRESSION_MAX_RATIO
+
+def compress_payload(data, peer_codecs):
+    """Compress data (bytes or a list of buffers) for a peer that accepts peer_codecs, returning (codec, payload, stats)"""
+    started = time.thread_time()
+    size = sum(len(part) for part in data) if isinstance(data, list) else len(data)
+    codec, level = choose_codec(size, peer_codecs)
+    if codec != CODEC_NONE:
+        joined = b"".join(data) if isinstance(data, list) else data
+        if not _looks_incompressible(joined):
+            compressed = _compress(joined, codec, level)
+            # Only keep the compressed form when it actually pays off
+            if len(compressed) <= size * COMPRESSION_MAX_RATIO:
+                stats = CompressionStats(codec, size, len(compressed), time.thread_time() - started)
+                return codec, compressed, stats
+                
+    stats = CompressionStats(CODEC_NONE, size, size, time.thread_time() - started)
+    return CODEC_NONE, data, stats
+
+def declared_size(data, codec):
+    """Uncompressed size recorded in a compressed payload, or None; zlib streams do not record it"""
+    if codec == CODEC_ZSTD and zstandard:
+        try:
+            size = zstandard.frame_content_size(data)
+        except zstandard.ZstdError:
+            return None
+        return size if size >= 0 else None
+    return None
+
+def decompress_payload(data, codec, max_size):
+    """Reverse compress_payload, refusing to inflate beyond max_size bytes"""
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        decompressor = zlib.decompressobj()
+        result = decompressor.decompress(data, max_size)
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError(f"Compressed payload inflates beyond {max_size} bytes")
+        return result
+    if codec == CODEC_ZSTD:
+        if not zstandard:
+            raise ValueError("Received zstd payload but zstandard is not installed")
+        if zstandard.frame_content_size(data) > max_size:
+            raise ValueError(f"Compressed payload inflates beyond {max_size} bytes")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=max_size)
+    raise ValueError(f"Unknown compression codec {codec}")
@@ -6,3 +6,42 @@ PAIRING_PORT = 65434
 BROADCAST_INTERVAL = 5  # seconds
 BUFFER_SIZE = 4096
 DEVICE_TIMEOUT = 15  # seconds to mark device as disconnected
+MAX_PAYLOAD_SIZE = 64 * 1024 * 1024  # largest framed message we accept, in bytes
+CONNECT_TIMEOUT = 5  # seconds to wait for a TCP connect
+POOL_IDLE_TIMEOUT = 60  # seconds before an unused pooled connection is closed
+FANOUT_WORKERS = 8  # clipboard sends that may run in parallel
+SEND_DEADLINE = 5  # seconds a single peer send may take before it is abandoned, plus time for its size at SEND_MIN_RATE
+SEND_MIN_RATE = 1024 * 1024  # bytes per second a large send is allowed to slow down to before it is abandoned
+CLIPBOARD_BACKEND = None  # None picks the best available backend, or "pyperclip" / "helper" / "fake"
+POLL_MIN_INTERVAL = 0.25  # seconds between clipboard polls right after a change
+POLL_MAX_INTERVAL = 2.0  # seconds between clipboard polls once the clipboard is idle
+POLL_BACKOFF = 1.5  # factor the poll interval grows by after each idle poll
+COUNTER_POLL_INTERVAL = 0.1  # seconds between reads of an OS clipboard change counter
+MAX_CONNECTIONS = 256  # clipboard connections served at once
+COMPRESSION_THRESHOLD = 4096  # clipboard messages smaller than this are sent uncompressed
+COMPRESSION_MAX_RATIO = 0.9  # compressed output must be at most this fraction of the input to be used
+COMPRESSION_SAMPLE_SIZE = 64 * 1024  # bytes test-compressed to detect incompressible payloads
+DELTA_MIN_SIZE = 4096  # clipboard text smaller than this is always sent in full
+DELTA_MAX_SIZE = 16 * 1024 * 1024  # larger text is not kept as a base for deltas
+DELTA_MAX_RATIO = 0.5  # a delta is only sent when it is at most this fraction of the full text
+DELTA_INLINE_SIZE = 64 * 1024  # deltas of shorter text are computed on the event loop, longer ones on a thread or worker process
+CONTENT_CACHE_SIZE = 64 * 1024 * 1024  # characters of recent clipboard content kept for dedupe
+OFFER_MIN_SIZE = 64 * 1024  # clipboard text at least this large is announced by digest before the body
+HISTORY_FILE_SIZE = 32 * 1024 * 1024  # bytes of the on-disk clipboard history ring
+HISTORY_MAX_ENTRY_SIZE = 4 * 1024 * 1024  # clipboard items larger than this are not kept in history
+DEBOUNCE_WINDOW = 0.1  # seconds a local clipboard change waits for a newer one before it is sent
+DEBOUNCE_MAX_DELAY = 0.5  # seconds a burst of clipboard changes may hold back the latest one
+METRICS_PORT = None  # localhost HTTP port serving Prometheus metrics, off unless set with --metrics-port or CLIPBOARDSYNC_METRICS_PORT
+METRICS_SOCKET = None  # Unix socket path to serve metrics on instead of the HTTP port
+DEVICE_EVENT_WINDOW = 0.2  # seconds device changes are collected before listeners are notified
+PERSIST_DELAY = 0.5  # seconds device state changes are collected before being written to disk
+BEACON_MIN_INTERVAL = 0.5  # seconds between beacons while peers appear or go missing; backs off to BROADCAST_INTERVAL
+PREFER_RELAY = True  # send through paired hubs when any are available, and directly only to peers they do not reach
+HUB_MAX_CONNECTIONS = 2048  # clipboard connections a hub serves at once
+HUB_FANOUT_WORKERS = 64  # sends a hub runs in parallel
+SEND_CHUNK_SIZE = 256 * 1024  # large payloads are written in slices of this size instead of being joined
+SPOOL_MIN_SIZE = 8 * 1024 * 1024  # encoded clipboard payloads at least this large that go to several peers are staged in a file and sent with sendfile
+CLIPBOARD_HELPER_TIMEOUT = 5  # seconds to wait for the clipboard helper process to answer a request
+ECHO_TRACKED_ITEMS = 8  # remote items written to the clipboard whose reappearance is not treated as a local copy
+OFFLOAD_MIN_SIZE = 1024 * 1024  # payloads at least this large are hashed, compressed and decompressed in worker processes
+OFFLOAD_WORKERS = 2  # worker processes for large payloads
@@ -0,0 +1,136 @@
+import asyncio
+import socket
+from config import CONNECT_TIMEOUT, POOL_IDLE_TIMEOUT, MAX_PAYLOAD_SIZE
+from framing import write_frame, write_unframed
+
+def _enable_keepalive(sock):
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    # Fine grained keepalive tuning is not available on every platform
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+    if hasattr(socket, "TCP_KEEPCNT"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+
+class PooledConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.idle_timer = None
+        
+    def is_closed(self):
+        # EOF with nothing left to read means the peer closed the connection
+        return self.writer.is_closing() or self.reader.at_eof()
+        
+    def close(self):
+        if self.idle_timer:
+            self.idle_timer.cancel()
+        self.writer.close()
+
+class ConnectionPool:
+    """Keeps one long-lived outgoing connection per peer IP. Must be used from the event loop."""
+    
+    def __init__(self, port, connect_timeout=CONNECT_TIMEOUT, idle_timeout=POOL_IDLE_TIMEOUT, local_ip=None):
+        self.port = port
+        self.local_addr = (local_ip, 0) if local_ip else None  # source address for outgoing connections
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.idle = {}  # ip -> PooledConnection
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+        self.evictions = 0
+        
+    async def _connect(self, ip):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, self.port, local_addr=self.local_addr), self.connect_timeout)
+        _enable_keepalive(writer.get_extra_info("socket"))
+        return PooledConnection(reader, writer)
+        
+    async def acquire(self, ip):
+        """Check out a connection to ip, reusing the pooled one when it is still open"""
+        connection = self.idle.pop(ip, None)
+        if connection:
+            connection.idle_timer.cancel()
+            if not connection.is_closed():
+                self.hits += 1
+                return connection
+            connection.close()
+        self.misses += 1
+        return await self._connect(ip)
+        
+    def release(self, ip, connection):
+        """Return a healthy connection to the pool, closing it once it has been idle too long"""
+        previous = self.idle.pop(ip, None)
+        if previous:
+            previous.close()
+        connection.idle_timer = asyncio.get_running_loop().call_later(self.idle_timeout, self._evict, ip, connection)
+        self.idle[ip] = connection
+        
+    def _evict(self, ip, connection):
+        if self.idle.get(ip) is connection:
+            del self.idle[ip]
+            connection.close()
+            self.evictions += 1
+            
+    async def send(self, ip, payload, flags=0, max_size=MAX_PAYLOAD_SIZE, read_reply=None):
+        """Write one frame on a pooled connection, reconnecting once if the pooled connection failed
+        
+        When read_reply is given it is awaited with the connection's reader after the write,
+        and its result is returned.
+        """
+        connection = await self.acquire(ip)
+        try:
+            reply = await self._exchange(connection, payload, flags, max_size, read_reply)
+        except (ConnectionError, OSError):
+            connection.close()
+            self.reconnects += 1
+            connection = await self._connect(ip)
+            try:
+                reply = await self._exchange(connection, payload, flags, max_size, read_reply)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            # Includes cancellation by a deadline, which leaves a partial frame on the wire
+            connection.close()
+            raise
+        self.release(ip, connection)
+        return reply
+        
+    async def send_unframed(self, ip, payload, max_size=MAX_PAYLOAD_SIZE):
+        """Write payload without a frame header on a connection of its own, closed once written
+        
+        Peers from before framing read one message per connection, so nothing is pooled.
+        """
+        connection = await self._connect(ip)
+        try:
+            await write_unframed(connection.writer, payload, max_size)
+        finally:
+            connection.close()
+            
+    async def _exchange(self, connection, payload, flags, max_size, read_reply):
+        await write_frame(connection.writer, payload, flags, max_size)
+        if read_reply:
+            return await read_reply(connection.reader)
+        return None
+        
+    def close(self, ip):
+        connection = self.idle.pop(ip, None)
+        if connection:
+            connection.close()
+            
+    def close_all(self):
+        for connection in self.idle.values():
+            connection.close()
+        self.idle.clear()
+        
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reconnects": self.reconnects,
+            "evictions": self.evictions,
+            "open": len(self.idle)
+        }
@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from config import CONTENT_CACHE_SIZE
+
+class ContentCache:
+    """Size-bounded LRU cache of clipboard text keyed by content digest"""
+    
+    def __init__(self, max_bytes=CONTENT_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # digest -> text
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        
+    def get(self, digest):
+        with self.lock:
+            text = self.entries.get(digest)
+            if text is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(digest)
+            self.hits += 1
+            return text
+            
+    def put(self, digest, text):
+        # Sizes are counted in characters, which is close enough to bytes for a budget
+        if len(text) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(digest, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[digest] = text
+            self.size += len(text)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+                
+    def __contains__(self, digest):
+        with self.lock:
+            return digest in self.entries
+            
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
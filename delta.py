@@ -0,0 +1,111 @@
+import json
+
+# Base positions tried for each line that does not continue the current copy; bounds the work on
+# text with many repeated lines
+MAX_CANDIDATES = 8
+# A copy of one line shorter than this costs more in the encoded delta than inserting the line
+MIN_SINGLE_COPY = 16
+
+def _common_prefix(a, b):
+    limit = min(len(a), len(b))
+    count = 0
+    while count < limit and a[count] == b[count]:
+        count += 1
+    return count
+
+def _common_suffix(a, b, prefix):
+    limit = min(len(a), len(b)) - prefix
+    count = 0
+    while count < limit and a[len(a) - 1 - count] == b[len(b) - 1 - count]:
+        count += 1
+    return count
+
+def _append_copy(ops, start, end):
+    if ops and not isinstance(ops[-1], str) and ops[-1][1] == start:
+        ops[-1][1] = end
+    else:
+        ops.append([start, end])
+
+def _run_length(a, i, b, j, limit):
+    count = 0
+    while count < limit and i + count < len(a) and a[i + count] == b[j + count]:
+        count += 1
+    return count
+
+def make_delta(base, text, max_insert=None):
+    """Line-based delta that turns base into text, in time linear in the number of lines.
+    
+    The delta is a list of ops: [start, end] copies lines start..end of base, a string is inserted as is.
+    Copies can come from anywhere in base, so moved blocks of lines are copied rather than resent.
+    Returns None as soon as more than max_insert characters would be inserted.
+    """
+    a = base.splitlines(keepends=True)
+    b = text.splitlines(keepends=True)
+    
+    # Most edits touch a small region, so strip the common ends before matching
+    prefix = _common_prefix(a, b)
+    suffix = _common_suffix(a, b, prefix)
+    ops = []
+    if prefix:
+        ops.append([0, prefix])
+        
+    positions = {}  # line -> its first MAX_CANDIDATES positions in base
+    for i in range(prefix, len(a) - suffix):
+        found = positions.setdefault(a[i], [])
+        if len(found) < MAX_CANDIDATES:
+            found.append(i)
+            
+    end = len(b) - suffix
+    j = prefix
+    next_line = None  # base position that would continue the previous copy
+    inserted = []  # lines inserted since the last copy, joined once rather than one at a time
+    inserted_size = 0
+    while j < end:
+        if next_line is not None and next_line < len(a) - suffix and a[next_line] == b[j]:
+            start, length = next_line, _run_length(a, next_line, b, j, end - j)
+        else:
+            # Greedily take the longest copy among the first few places this line occurs in base
+            start, length = None, 0
+            for i in positions.get(b[j], ()):
+                run = _run_length(a, i, b, j, end - j)
+                if run > length:
+                    start, length = i, run
+        if length == 0 or (length == 1 and len(b[j]) < MIN_SINGLE_COPY):
+            inserted.append(b[j])
+            inserted_size += len(b[j])
+            if max_insert is not None and inserted_size > max_insert:
+                return None
+            next_line = None
+            j += 1
+            continue
+        if inserted:
+            ops.append("".join(inserted))
+            inserted = []
+        _append_copy(ops, start, start + length)
+        next_line = start + length
+        j += length
+        
+    if inserted:
+        ops.append("".join(inserted))
+    if suffix:
+        _append_copy(ops, len(a) - suffix, len(a))
+    return ops
+
+def apply_delta(base, ops):
+    lines = base.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            start, end = op
+            if not 0 <= start <= end <= len(lines):
+                raise ValueError(f"Delta copies lines {start}-{end} of a {len(lines)} line base")
+            parts.extend(lines[start:end])
+    return "".join(parts)
+
+def encode_delta(ops):
+    return json.dumps(ops, separators=(",", ":")).encode("utf-8")
+
+def decode_delta(text):
+    return json.loads(text)
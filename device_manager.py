@@ -4,7 +4,10 @@ import socket
 import threading
 import json
 import os
+from config import DEVICE_EVENT_WINDOW
+from persistence import WriteBehindStore
 from message import Message, MessageType
+from metrics import call_timed
 
 class DeviceStatus:
     DISCOVERED = "discovered"
@@ -21,6 +24,7 @@ class Device:
         self.status = DeviceStatus.DISCOVERED
         self.pairing_pending = False
         self.manually_disconnected = False
+        self.capabilities = []  # features the peer advertised, such as compression codecs
         
     def update_seen(self):
         self.last_seen = time.time()
@@ -37,53 +41,144 @@ class Device:
             "last_seen": self.last_seen,
             "status": self.status,
             "pairing_pending": self.pairing_pending,
-            "manually_disconnected": self.manually_disconnected
+            "manually_disconnected": self.manually_disconnected,
+            "capabilities": self.capabilities
         }
         
+class DeviceEvent:
+    ADDED = "added"
+    REMOVED = "removed"
+    STATUS_CHANGED = "status_changed"
+    CHANGED = "changed"  # hostname, permissions, pairing state or capabilities
+    LAST_SEEN = "last_seen"  # a heartbeat that changed nothing else
+    
+    # Within one window the strongest change to a device wins
+    PRIORITY = {LAST_SEEN: 0, CHANGED: 1, STATUS_CHANGED: 2}
+    
+    def __init__(self, kind, ip, device):
+        self.kind = kind
+        self.ip = ip
+        self.device = device  # None for removed devices
+        
+    def __repr__(self):
+        return f"DeviceEvent({self.kind}, {self.ip})"
+        
+def merge_device_events(old, new):
+    """Combine two pending event kinds for one device, returning None when they cancel out"""
+    if old is None:
+        return new
+    if old == DeviceEvent.ADDED:
+        return None if new == DeviceEvent.REMOVED else DeviceEvent.ADDED
+    if new == DeviceEvent.REMOVED:
+        return DeviceEvent.REMOVED
+    if old == DeviceEvent.REMOVED or new == DeviceEvent.ADDED:
+        # Removed and added again within the window, so listeners only need to refresh it
+        return DeviceEvent.STATUS_CHANGED
+    return max(old, new, key=DeviceEvent.PRIORITY.get)
+    
 class DeviceManager:
     def __init__(self):
         self.devices = {}  # ip -> Device
         self.pairing_callbacks = []
         self.device_updates_callbacks = []
+        self.device_events_callbacks = []  # (callback, include_last_seen)
+        self.device_seen_callbacks = []
         self.devices_lock = threading.RLock()
         self.pairing_enabled = True
+        self.event_window = DEVICE_EVENT_WINDOW
+        self.pending_events = {}  # ip -> event kind waiting for the window to close
+        self.event_timer = None
+        self.config_file = os.path.expanduser("~/.clipboardsync/paired_devices.json")
         self.load_paired_devices()
+        self.store = WriteBehindStore(self.config_file, self._paired_devices_snapshot)
         
     def register_pairing_callback(self, callback):
         self.pairing_callbacks.append(callback)
         
     def register_device_updates_callback(self, callback):
+        """callback() runs once per window in which a device really changed"""
         self.device_updates_callbacks.append(callback)
         
+    def register_device_seen_callback(self, callback):
+        """callback(ip, last_seen) runs on every heartbeat, on the caller's thread, so it must be cheap"""
+        self.device_seen_callbacks.append(callback)
+        
+    def register_device_events_callback(self, callback, include_last_seen=False):
+        """callback(events) receives the list of DeviceEvents collected in each window"""
+        self.device_events_callbacks.append((callback, include_last_seen))
+        
     def notify_device_updates(self):
         for callback in self.device_updates_callbacks:
-            callback()
+            call_timed("device_updates", callback)
+            
+    def _queue_event(self, kind, ip):
+        with self.devices_lock:
+            if kind == DeviceEvent.LAST_SEEN and not any(wants for _, wants in self.device_events_callbacks):
+                # Nobody listens for heartbeats, so do not even start the timer
+                return
+            merged = merge_device_events(self.pending_events.get(ip), kind)
+            if merged is None:
+                self.pending_events.pop(ip, None)
+            else:
+                self.pending_events[ip] = merged
+            if self.pending_events and self.event_timer is None:
+                self.event_timer = threading.Timer(self.event_window, self.flush_device_events)
+                self.event_timer.daemon = True
+                self.event_timer.start()
+                
+    def flush_device_events(self):
+        """Deliver the events collected so far; runs when the window closes"""
+        with self.devices_lock:
+            pending, self.pending_events = self.pending_events, {}
+            if self.event_timer:
+                self.event_timer.cancel()
+                self.event_timer = None
+            events = [DeviceEvent(kind, ip, self.devices.get(ip)) for ip, kind in pending.items()]
+            
+        changes = [event for event in events if event.kind != DeviceEvent.LAST_SEEN]
+        for callback, include_last_seen in self.device_events_callbacks:
+            selected = events if include_last_seen else changes
+            if selected:
+                call_timed("device_events", callback, selected)
+        if changes:
+            self.notify_device_updates()
             
     def get_device(self, ip):
         with self.devices_lock:
             return self.devices.get(ip)
             
-    def add_or_update_device(self, ip, hostname="Unknown", status=None):
+    def add_or_update_device(self, ip, hostname="Unknown", status=None, capabilities=None):
         with self.devices_lock:
-            if ip not in self.devices:
-                self.devices[ip] = Device(ip, hostname)
+            device = self.devices.get(ip)
+            if device is None:
+                device = self.devices[ip] = Device(ip, hostname)
                 if status:
-                    self.devices[ip].status = status
+                    device.status = status
+                kind = DeviceEvent.ADDED
             else:
-                self.devices[ip].update_seen()
-                if hostname != "Unknown":
-                    self.devices[ip].hostname = hostname
-                if status:
-                    self.devices[ip].status = status
-            
-            self.notify_device_updates()
-            return self.devices[ip]
+                device.update_seen()
+                kind = DeviceEvent.LAST_SEEN
+                if hostname != "Unknown" and hostname != device.hostname:
+                    device.hostname = hostname
+                    kind = DeviceEvent.CHANGED
+                if status and status != device.status:
+                    device.status = status
+                    kind = DeviceEvent.STATUS_CHANGED
+            if capabilities is not None and capabilities != device.capabilities:
+                device.capabilities = capabilities
+                if kind == DeviceEvent.LAST_SEEN:
+                    kind = DeviceEvent.CHANGED
+                    
+            for callback in self.device_seen_callbacks:
+                callback(ip, device.last_seen)
+            self._queue_event(kind, ip)
+            return device
             
     def remove_device(self, ip):
         with self.devices_lock:
             if ip in self.devices:
                 del self.devices[ip]
-                self.notify_device_updates()
+                self._queue_event(DeviceEvent.REMOVED, ip)
                 
     def get_active_devices(self):
         active_devices = []
@@ -98,14 +193,26 @@ class DeviceManager:
             if ip in self.devices:
                 self.devices[ip].send_enabled = enabled
                 self.save_paired_devices()
-                self.notify_device_updates()
+                self._queue_event(DeviceEvent.CHANGED, ip)
                 
     def set_receive_enabled(self, ip, enabled):
         with self.devices_lock:
             if ip in self.devices:
                 self.devices[ip].receive_enabled = enabled
                 self.save_paired_devices()
-                self.notify_device_updates()
+                self._queue_event(DeviceEvent.CHANGED, ip)
+                
+    def set_pairing_pending(self, ip, pending):
+        with self.devices_lock:
+            if ip in self.devices and self.devices[ip].pairing_pending != pending:
+                self.devices[ip].pairing_pending = pending
+                self._queue_event(DeviceEvent.CHANGED, ip)
+                
+    def set_device_status(self, ip, status):
+        with self.devices_lock:
+            if ip in self.devices and self.devices[ip].status != status:
+                self.devices[ip].status = status
+                self._queue_event(DeviceEvent.STATUS_CHANGED, ip)
                 
     def is_allowed_to_send(self, ip):
         with self.devices_lock:
@@ -119,7 +226,7 @@ class DeviceManager:
         
     def handle_pairing_request(self, sender_ip, sender_name):
         for callback in self.pairing_callbacks:
-            callback(sender_ip, sender_name)
+            call_timed("pairing_request", callback, sender_ip, sender_name)
             
     def accept_pairing(self, ip):
         with self.devices_lock:
@@ -127,7 +234,7 @@ class DeviceManager:
                 self.devices[ip].status = DeviceStatus.PAIRED
                 self.devices[ip].pairing_pending = False
                 self.save_paired_devices()
-                self.notify_device_updates()
+                self._queue_event(DeviceEvent.STATUS_CHANGED, ip)
                 return True
             return False
             
@@ -135,7 +242,7 @@ class DeviceManager:
         with self.devices_lock:
             if ip in self.devices:
                 self.devices[ip].pairing_pending = False
-                self.notify_device_updates()
+                self._queue_event(DeviceEvent.CHANGED, ip)
                 
     def disconnect_device(self, ip):
         with self.devices_lock:
@@ -146,9 +253,17 @@ class DeviceManager:
                 # Add a flag to prevent auto-reconnection from discovery
                 self.devices[ip].manually_disconnected = True
                 self.save_paired_devices()
-                self.notify_device_updates()
+                self._queue_event(DeviceEvent.STATUS_CHANGED, ip)
                 
     def save_paired_devices(self):
+        """Mark paired device state as changed; a background thread writes it shortly after"""
+        self.store.mark_dirty()
+        
+    def close(self):
+        """Write any pending changes before exiting"""
+        self.store.close()
+        
+    def _paired_devices_snapshot(self):
         paired_devices = {}
         with self.devices_lock:
             for ip, device in self.devices.items():
@@ -159,20 +274,13 @@ class DeviceManager:
                         "receive_enabled": device.receive_enabled,
                         "manually_disconnected": device.manually_disconnected
                     }
+        return paired_devices
+        
         
-        try:
-            config_dir = os.path.expanduser("~/.clipboardsync")
-            os.makedirs(config_dir, exist_ok=True)
-            with open(os.path.join(config_dir, "paired_devices.json"), "w") as f:
-                json.dump(paired_devices, f)
-        except Exception as e:
-            print(f"Error saving paired devices: {e}")
-            
     def load_paired_devices(self):
         try:
-            config_file = os.path.expanduser("~/.clipboardsync/paired_devices.json")
-            if os.path.exists(config_file):
-                with open(config_file, "r") as f:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, "r") as f:
                     paired_devices = json.load(f)
                     
                 with self.devices_lock:
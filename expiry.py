@@ -0,0 +1,92 @@
+import heapq
+import threading
+import time
+
+class ExpiryScheduler:
+    """Calls on_expire(key) on the event loop once a key has not been touched for timeout seconds.
+    
+    Each key has one entry in a min-heap. A touch only moves the key's deadline in a dict, which is
+    O(1); when an entry comes due with a later deadline it is pushed back in instead of expiring.
+    The loop holds a single timer for the earliest entry, so it only wakes when an entry comes due.
+    """
+    
+    def __init__(self, timeout, on_expire):
+        self.timeout = timeout
+        self.on_expire = on_expire
+        self.deadlines = {}  # key -> time.time() after which it expires
+        self.heap = []  # (deadline, key), at most one entry per key
+        self.lock = threading.Lock()
+        self.loop = None
+        self.timer = None
+        self.timer_deadline = None
+        self.expired = 0
+        
+    def start(self, loop):
+        self.loop = loop
+        loop.call_soon_threadsafe(self._reschedule)
+        
+    def stop(self):
+        """Cancel the timer; must be called on the event loop"""
+        if self.timer:
+            self.timer.cancel()
+        self.timer = self.timer_deadline = None
+        self.loop = None
+        
+    def touch(self, key, seen=None):
+        """Push key's deadline to timeout seconds after seen; safe to call from any thread"""
+        deadline = (seen or time.time()) + self.timeout
+        with self.lock:
+            if key in self.deadlines:
+                self.deadlines[key] = max(self.deadlines[key], deadline)
+                return
+            self.deadlines[key] = deadline
+            heapq.heappush(self.heap, (deadline, key))
+            loop = self.loop
+            wake = loop and (self.timer_deadline is None or deadline < self.timer_deadline)
+        if wake:
+            try:
+                loop.call_soon_threadsafe(self._reschedule)
+            except RuntimeError:
+                # The loop has already closed
+                pass
+                
+    def discard(self, key):
+        with self.lock:
+            self.deadlines.pop(key, None)
+            
+    def _reschedule(self):
+        with self.lock:
+            if not self.loop:
+                return
+            deadline = self.heap[0][0] if self.heap else None
+            if deadline == self.timer_deadline:
+                return
+            if self.timer:
+                self.timer.cancel()
+            self.timer_deadline = deadline
+            self.timer = None if deadline is None else self.loop.call_later(max(deadline - time.time(), 0), self._fire)
+            
+    def _fire(self):
+        now = time.time()
+        expired = []
+        with self.lock:
+            self.timer = self.timer_deadline = None
+            while self.heap and self.heap[0][0] <= now:
+                _, key = heapq.heappop(self.heap)
+                deadline = self.deadlines.get(key)
+                if deadline is None:
+                    continue
+                if deadline > now:
+                    # Touched since the entry was pushed, so it goes back in at its real deadline
+                    heapq.heappush(self.heap, (deadline, key))
+                else:
+                    del self.deadlines[key]
+                    expired.append(key)
+                    
+        for key in expired:
+            self.expired += 1
+            try:
+                self.on_expire(key)
+            except Exception as e:
+                print(f"Error expiring {key}: {e}")
+        self._reschedule()
@@ -0,0 +1,312 @@
+import asyncio
+import mmap
+import os
+import struct
+import tempfile
+import weakref
+from config import BUFFER_SIZE, MAX_PAYLOAD_SIZE, SEND_CHUNK_SIZE
+
+# Every TCP message is sent as a frame: an 8 byte header followed by the payload.
+# Header layout: magic (2 bytes), version (1 byte), flags (1 byte), payload length (4 bytes, big endian)
+FRAME_MAGIC = b"CS"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("!2sBBI")
+
+# Flag bits 0-1 carry the compression codec (see compression.py)
+FLAG_BINARY = 0x04  # payload is a binary-codec Message rather than JSON
+
+# Above this size the header and payload are written separately instead of being joined
+COALESCE_LIMIT = 64 * 1024
+
+class FrameError(Exception):
+    pass
+
+def _remove_spool(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+class SpoolFile:
+    """A frame payload staged in a temporary file, so that every send can use sendfile
+    
+    The file is removed once the SpoolFile is garbage collected. Each send opens its own handle,
+    so sends to several peers never share a file position.
+    """
+    
+    def __init__(self, parts):
+        fd, self.path = tempfile.mkstemp(prefix="clipboardsync-spool-")
+        self._finalizer = weakref.finalize(self, _remove_spool, self.path)
+        with os.fdopen(fd, "wb") as f:
+            for part in parts:
+                f.write(part)
+            self.size = f.tell()
+            
+    def __len__(self):
+        return self.size
+        
+    def open(self):
+        return open(self.path, "rb")
+
+def encode_frame_header(length, flags=0):
+    if length > 0xFFFFFFFF:
+        raise FrameError(f"Payload of {length} bytes does not fit in a frame")
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, length)
+
+async def read_frame(reader, max_size=MAX_PAYLOAD_SIZE):
+    """Receive one frame from an asyncio StreamReader, returning (flags, payload) or None on a clean close"""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ConnectionError("Connection closed in the middle of a frame header")
+        
+    magic, version, flags, length = FRAME_HEADER.unpack(header)
+    if magic != FRAME_MAGIC:
+        if header[:1] == b"{":
+            return 0, await _read_legacy(reader, header, max_size)
+        raise FrameError(f"Bad frame magic {magic!r}")
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version {version}")
+    if length > max_size:
+        raise FrameError(f"Frame of {length} bytes exceeds limit of {max_size} bytes")
+        
+    try:
+        return flags, await reader.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        raise ConnectionError(f"Connection closed after {len(e.partial)} of {length} bytes")
+
+async def _read_legacy(reader, prefix, max_size):
+    buffer = bytearray(prefix)
+    while True:
+        chunk = await reader.read(max(BUFFER_SIZE, 256 * 1024))
+        if not chunk:
+            return bytes(buffer)
+        if len(buffer) + len(chunk) > max_size:
+            raise FrameError(f"Legacy message exceeds limit of {max_size} bytes")
+        buffer += chunk
+
+async def write_frame(writer, payload, flags=0, max_size=MAX_PAYLOAD_SIZE):
+    """Send a single framed payload over an asyncio StreamWriter
+    
+    The payload is bytes, a SpoolFile or a list of those. Small frames are joined into one write;
+    large ones are written in memoryview slices, or with sendfile for spooled parts, so the
+    transport never holds a second copy of the whole payload.
+    """
+    parts = payload if isinstance(payload, list) else [payload]
+    length = sum(len(part) for part in parts)
+    if length > max_size:
+        raise FrameError(f"Payload of {length} bytes exceeds limit of {max_size} bytes")
+    await _write_parts(writer, [encode_frame_header(length, flags)] + parts, length)
+
+async def write_unframed(writer, payload, max_size=MAX_PAYLOAD_SIZE):
+    """Send a payload with no frame header, for peers from before framing
+    
+    Those read a single JSON message per connection, so the caller closes the connection afterwards.
+    """
+    parts = payload if isinstance(payload, list) else [payload]
+    length = sum(len(part) for part in parts)
+    if length > max_size:
+        raise FrameError(f"Payload of {length} bytes exceeds limit of {max_size} bytes")
+    await _write_parts(writer, parts, length)
+
+async def _write_parts(writer, parts, length):
+    if length <= COALESCE_LIMIT and not any(isinstance(part, SpoolFile) for part in parts):
+        writer.writelines(parts)
+        await writer.drain()
+        return
+        
+    for part in parts:
+        if isinstance(part, SpoolFile):
+            with part.open() as f:
+                await asyncio.get_running_loop().sendfile(writer.transport, f)
+            continue
+        view = memoryview(part)
+        for offset in range(0, len(view), SEND_CHUNK_SIZE):
+            writer.write(view[offset:offset + SEND_CHUNK_SIZE])
+            await writer.drain()
+    await writer.drain()
+
+class FrameConnection(asyncio.BufferedProtocol):
+    """Server side of a framed connection that receives every payload straight into its final buffer
+    
+    Each frame's payload is read with recv_into into a bytearray of exactly its length, so it is
+    copied once out of the kernel and never while being reassembled. Payloads of at least
+    spool_size bytes are streamed through a fixed buffer into a temporary file instead and
+    delivered as a memoryview of the mapped file, so they never sit in anonymous memory. Reading
+    pauses while a completed frame waits for read_frame(). The writelines, write and drain methods
+    let write_frame() reply on the same connection.
+    """
+    
+    def __init__(self, handler, max_size=MAX_PAYLOAD_SIZE, spool_size=None):
+        self.handler = handler  # coroutine function called with this connection once it is made
+        self.max_size = max_size
+        self.spool_size = spool_size
+        self.spool = None  # temporary file receiving the current large payload
+        self.spool_left = 0  # bytes of that payload not yet written to the file
+        self.transport = None
+        self.header = bytearray(FRAME_HEADER.size)
+        self.buffer = self.header  # header, payload or legacy message currently being filled
+        self.received = 0
+        self.flags = 0
+        self.legacy = False
+        self.frame = None  # completed (flags, payload) waiting for read_frame()
+        self.error = None
+        self.closed = False
+        self.read_waiter = None
+        self.write_paused = False
+        self.drain_waiter = None
+        
+    def connection_made(self, transport):
+        self.transport = transport
+        asyncio.get_running_loop().create_task(self.handler(self))
+        
+    def get_buffer(self, sizehint):
+        if self.legacy and self.received == len(self.buffer):
+            # Older peers send unframed JSON and close, so the size is only known at EOF
+            self.buffer.extend(bytes(max(BUFFER_SIZE, sizehint)))
+        if self.spool:
+            # Never read past the end of the payload into the next frame
+            return memoryview(self.buffer)[self.received:min(len(self.buffer), self.spool_left)]
+        return memoryview(self.buffer)[self.received:]
+        
+    def buffer_updated(self, nbytes):
+        self.received += nbytes
+        if self.legacy:
+            if self.received > self.max_size:
+                self._fail(FrameError(f"Legacy message exceeds limit of {self.max_size} bytes"))
+        elif self.spool:
+            if self.received == min(len(self.buffer), self.spool_left):
+                self._spool_chunk()
+        elif self.received == len(self.buffer):
+            if self.buffer is self.header:
+                self._start_payload()
+            else:
+                self._complete(self.buffer)
+                
+    def _start_payload(self):
+        magic, version, flags, length = FRAME_HEADER.unpack(self.header)
+        if magic != FRAME_MAGIC:
+            if self.header[:1] == b"{":
+                self.legacy = True
+                self.buffer = bytearray(self.header)
+                return
+            self._fail(FrameError(f"Bad frame magic {bytes(magic)!r}"))
+        elif version != FRAME_VERSION:
+            self._fail(FrameError(f"Unsupported frame version {version}"))
+        elif length > self.max_size:
+            self._fail(FrameError(f"Frame of {length} bytes exceeds limit of {self.max_size} bytes"))
+        elif length == 0:
+            self.flags = flags
+            self._complete(bytearray())
+        elif self.spool_size and length >= self.spool_size:
+            self.flags = flags
+            self.spool = tempfile.TemporaryFile(prefix="clipboardsync-spool-")
+            self.spool_left = length
+            self.buffer = bytearray(SEND_CHUNK_SIZE)
+            self.received = 0
+        else:
+            self.flags = flags
+            self.buffer = bytearray(length)
+            self.received = 0
+            
+    def _spool_chunk(self):
+        try:
+            self.spool.write(memoryview(self.buffer)[:self.received])
+            self.spool_left -= self.received
+            self.received = 0
+            if self.spool_left:
+                return
+            self.spool.flush()
+            # The mapping keeps the data after the file is closed; pages load as they are read
+            mapping = mmap.mmap(self.spool.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            self._discard_spool()
+            self._fail(e)
+            return
+        self._discard_spool()
+        self._complete(memoryview(mapping))
+        
+    def _discard_spool(self):
+        if self.spool:
+            self.spool.close()
+            self.spool = None
+            
+    def _complete(self, payload):
+        self.frame = (self.flags, payload)
+        self.buffer = self.header
+        self.received = 0
+        if not self.closed:
+            self.transport.pause_reading()
+        self._wake_reader()
+        
+    def _fail(self, error):
+        self.error = error
+        self.transport.close()
+        self._wake_reader()
+        
+    def _wake_reader(self):
+        if self.read_waiter and not self.read_waiter.done():
+            self.read_waiter.set_result(None)
+            
+    def eof_received(self):
+        if self.legacy:
+            self.legacy = False
+            self._complete(self.buffer[:self.received])
+        return False
+        
+    def connection_lost(self, exc):
+        self.closed = True
+        self._discard_spool()
+        self._wake_reader()
+        if self.drain_waiter and not self.drain_waiter.done():
+            self.drain_waiter.set_exception(exc or ConnectionResetError("Connection lost"))
+            
+    async def read_frame(self):
+        """Return the next (flags, payload), or None once the peer closed the connection cleanly"""
+        while self.frame is None:
+            if self.error:
+                raise self.error
+            if self.closed:
+                if self.received or self.buffer is not self.header:
+                    raise ConnectionError("Connection closed in the middle of a frame")
+                return None
+            self.read_waiter = asyncio.get_running_loop().create_future()
+            await self.read_waiter
+        frame, self.frame = self.frame, None
+        if not self.closed:
+            self.transport.resume_reading()
+        return frame
+        
+    def pause_writing(self):
+        self.write_paused = True
+        
+    def resume_writing(self):
+        self.write_paused = False
+        if self.drain_waiter and not self.drain_waiter.done():
+            self.drain_waiter.set_result(None)
+            
+    def write(self, data):
+        self.transport.write(data)
+        
+    def writelines(self, parts):
+        self.transport.writelines(parts)
+        
+    async def drain(self):
+        if self.closed:
+            raise ConnectionResetError("Connection lost")
+        if self.write_paused:
+            self.drain_waiter = asyncio.get_running_loop().create_future()
+            await self.drain_waiter
+            
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
+        
+    def close(self):
+        self.transport.close()
+
+async def start_frame_server(handler, host, port, max_size=MAX_PAYLOAD_SIZE, spool_size=None):
+    """Like asyncio.start_server, but handler(connection) gets a FrameConnection"""
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(lambda: FrameConnection(handler, max_size, spool_size), host, port, reuse_address=True)
@@ -0,0 +1,45 @@
+"""Clipboard sync without a window, for servers and login sessions.
+
+Never imports tkinter. Devices paired earlier keep syncing; new pairing requests are only
+accepted when --accept-pairing is given, since there is nobody to answer a dialog.
+
+    python main.py --headless
+"""
+import signal
+import threading
+import time
+from device_manager import DeviceManager
+from network import NetworkManager
+
+def run_until_signal(network_manager, device_manager):
+    """Block until SIGINT or SIGTERM, then shut both managers down"""
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    stop.wait()
+    
+    network_manager.stop()
+    # Write paired device changes that are still waiting for the background flush
+    device_manager.close()
+
+def main(accept_pairing=False, bind_ip=None, metrics_port=None):
+    started = time.perf_counter()
+    device_manager = DeviceManager()
+    network_manager = NetworkManager(device_manager, bind_ip=bind_ip)
+    if metrics_port:
+        network_manager.metrics_port = metrics_port
+    
+    def on_pairing_request(ip, hostname):
+        if accept_pairing:
+            # There is no window to toggle sending and receiving later, so enable both now
+            device_manager.set_send_enabled(ip, True)
+            device_manager.set_receive_enabled(ip, True)
+            network_manager.send_pairing_response(ip, True)
+        else:
+            print(f"Pairing request from {hostname} ({ip}) left unanswered; restart with --accept-pairing to accept it")
+            
+    device_manager.register_pairing_callback(on_pairing_request)
+    network_manager.register_notification_callback(lambda title, message: print(f"{title}: {message}"))
+    network_manager.start()
+    print(f"Ready to sync on {network_manager.local_ip} after {time.perf_counter() - started:.3f}s", flush=True)
+    run_until_signal(network_manager, device_manager)
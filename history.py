@@ -0,0 +1,239 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from config import HISTORY_FILE_SIZE, HISTORY_MAX_ENTRY_SIZE
+from clipboard import content_digest
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# The history file is a fixed-size ring of records behind a small header:
+# magic, version, capacity, write offset, offset of the oldest record, record count, next sequence number
+FILE_MAGIC = b"CSHR"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("!4sBQQQQQ")
+DATA_START = 64
+
+# Record: total length, sequence, timestamp, digest (16 bytes), origin kind, origin length, content length,
+# followed by the origin and the UTF-8 content. A zero length marks the point where writing wrapped.
+RECORD_HEADER = struct.Struct("!IQd16sBHI")
+WRAP_MARKER = struct.Struct("!I")
+
+ORIGIN_LOCAL = 0
+ORIGIN_REMOTE = 1
+
+def lock_file(file):
+    """Lock file for as long as it stays open, returning False when another process holds it"""
+    try:
+        if os.name == "nt":
+            # Locks bytes from the current position, so always the first one
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+class HistoryEntry:
+    __slots__ = ("seq", "offset", "length", "timestamp", "digest", "origin_kind", "origin")
+    
+    def __init__(self, seq, offset, length, timestamp, digest, origin_kind, origin):
+        self.seq = seq
+        self.offset = offset
+        self.length = length
+        self.timestamp = timestamp
+        self.digest = digest
+        self.origin_kind = origin_kind
+        self.origin = origin
+        
+    def to_dict(self):
+        return {
+            "seq": self.seq,
+            "timestamp": self.timestamp,
+            "digest": self.digest,
+            "origin": self.origin,
+            "local": self.origin_kind == ORIGIN_LOCAL,
+            "size": self.length - RECORD_HEADER.size - len(self.origin.encode("utf-8"))
+        }
+
+class ClipboardHistory:
+    """Clipboard history kept in a size-capped, memory-mapped ring file.
+    
+    Only record metadata is held in memory; content stays in the mapped file. Appends and digest
+    lookups are O(1), and the oldest records are overwritten once the ring is full. The file is
+    locked while open; when another process holds it this history is kept in memory only.
+    """
+    
+    def __init__(self, path=None, capacity=HISTORY_FILE_SIZE, max_entry_size=HISTORY_MAX_ENTRY_SIZE):
+        self.path = path or os.path.expanduser("~/.clipboardsync/history.ring")
+        self.capacity = capacity
+        self.max_entry_size = max_entry_size
+        self.lock = threading.Lock()
+        self.entries = deque()  # oldest first
+        self.by_digest = {}  # digest -> newest HistoryEntry with that content
+        self.head = DATA_START
+        self.next_seq = 1
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "a+b")
+        if lock_file(self.file):
+            if os.path.getsize(self.path) != capacity:
+                self.file.truncate(capacity)
+            self.map = mmap.mmap(self.file.fileno(), capacity)
+        else:
+            # Two writers would overwrite each other's records and header
+            print(f"Clipboard history {self.path} is in use by another process, keeping history in memory only")
+            self.file.close()
+            self.file = None
+            self.map = mmap.mmap(-1, capacity)
+        self._load()
+        
+    def _load(self):
+        try:
+            magic, version, capacity, head, tail, count, next_seq = FILE_HEADER.unpack_from(self.map, 0)
+            if magic != FILE_MAGIC or version != FILE_VERSION or capacity != self.capacity:
+                self._write_header()
+                return
+                
+            offset = tail
+            for _ in range(count):
+                entry, offset = self._read_entry(offset)
+                if entry is None or (self.entries and entry.seq <= self.entries[-1].seq):
+                    # Stop at the first damaged record, keeping everything before it
+                    break
+                self._index(entry)
+            self.head = head
+            self.next_seq = max(next_seq, self.entries[-1].seq + 1 if self.entries else 1)
+        except (struct.error, ValueError, UnicodeDecodeError) as e:
+            print(f"Error loading clipboard history, starting empty: {e}")
+            self.entries.clear()
+            self.by_digest.clear()
+            self.head = DATA_START
+            self._write_header()
+            
+    def _read_entry(self, offset):
+        """Read the record at offset, following a wrap marker, and return it with the next offset"""
+        if offset + RECORD_HEADER.size > self.capacity or WRAP_MARKER.unpack_from(self.map, offset)[0] == 0:
+            offset = DATA_START
+        length, seq, timestamp, digest, origin_kind, origin_len, content_len = RECORD_HEADER.unpack_from(self.map, offset)
+        if length != RECORD_HEADER.size + origin_len + content_len or offset + length > self.capacity:
+            return None, offset
+        start = offset + RECORD_HEADER.size
+        origin = self.map[start:start + origin_len].decode("utf-8")
+        return HistoryEntry(seq, offset, length, timestamp, digest.hex(), origin_kind, origin), offset + length
+        
+    def _index(self, entry):
+        self.entries.append(entry)
+        self.by_digest[entry.digest] = entry
+        
+    def _evict_oldest(self):
+        entry = self.entries.popleft()
+        if self.by_digest.get(entry.digest) is entry:
+            del self.by_digest[entry.digest]
+            
+    def _write_header(self):
+        tail = self.entries[0].offset if self.entries else self.head
+        FILE_HEADER.pack_into(self.map, 0, FILE_MAGIC, FILE_VERSION, self.capacity, self.head, tail, len(self.entries), self.next_seq)
+        
+    def append(self, text, origin, local, timestamp=None, digest=None):
+        """Record a clipboard item, returning its entry, or None if it is too large or repeats the last item"""
+        content = text.encode("utf-8")
+        digest = digest or content_digest(content)
+        origin_bytes = origin.encode("utf-8")
+        length = RECORD_HEADER.size + len(origin_bytes) + len(content)
+        if len(content) > self.max_entry_size or length > self.capacity - DATA_START:
+            return None
+            
+        with self.lock:
+            if self.map.closed or (self.entries and self.entries[-1].digest == digest):
+                return None
+                
+            offset = self.head
+            if offset + length > self.capacity:
+                # Records past the write position are the oldest ones, so they go before wrapping
+                while self.entries and self.entries[0].offset >= self.head:
+                    self._evict_oldest()
+                if offset + WRAP_MARKER.size <= self.capacity:
+                    WRAP_MARKER.pack_into(self.map, offset, 0)
+                offset = DATA_START
+            while self.entries and offset <= self.entries[0].offset < offset + length:
+                self._evict_oldest()
+                
+            entry = HistoryEntry(
+                self.next_seq, offset, length, timestamp or time.time(), digest,
+                ORIGIN_LOCAL if local else ORIGIN_REMOTE, origin
+            )
+            RECORD_HEADER.pack_into(
+                self.map, offset, length, entry.seq, entry.timestamp, bytes.fromhex(digest),
+                entry.origin_kind, len(origin_bytes), len(content)
+            )
+            start = offset + RECORD_HEADER.size
+            self.map[start:start + len(origin_bytes)] = origin_bytes
+            start += len(origin_bytes)
+            self.map[start:start + len(content)] = content
+            
+            self._index(entry)
+            self.head = offset + length
+            self.next_seq += 1
+            self._write_header()
+            return entry
+            
+    def _read_content(self, entry):
+        start = entry.offset + RECORD_HEADER.size + len(entry.origin.encode("utf-8"))
+        return self.map[start:entry.offset + entry.length].decode("utf-8")
+        
+    def get(self, digest):
+        """Return the text stored for digest, or None if it is no longer in the ring"""
+        with self.lock:
+            entry = self.by_digest.get(digest)
+            return self._read_content(entry) if entry else None
+            
+    def _position(self, seq):
+        """Index in entries of the first entry whose sequence number is at least seq"""
+        low, high = 0, len(self.entries)
+        while low < high:
+            middle = (low + high) // 2
+            if self.entries[middle].seq < seq:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+        
+    def list(self, limit=50, before=None):
+        """Newest entries first, optionally only those with a sequence number below before
+        
+        Passing the seq of the last entry returned gives the next page.
+        """
+        with self.lock:
+            end = len(self.entries) if before is None else self._position(before)
+            return [self.entries[index].to_dict() for index in range(end - 1, max(end - limit, 0) - 1, -1)]
+        
+    def search(self, query, limit=20):
+        """Newest entries first whose content contains query, ignoring case"""
+        query = query.lower()
+        result = []
+        with self.lock:
+            for entry in reversed(self.entries):
+                if query in self._read_content(entry).lower():
+                    result.append(entry.to_dict())
+                    if len(result) >= limit:
+                        break
+        return result
+        
+    def __len__(self):
+        return len(self.entries)
+        
+    def close(self):
+        with self.lock:
+            if self.map.closed:
+                return
+            self.map.flush()
+            self.map.close()
+            if self.file:
+                self.file.close()
@@ -0,0 +1,55 @@
+"""Headless hub that relays clipboard items between its paired clients.
+
+Clients send each item once to the hub, naming the peers they may send to, and the hub forwards
+it to those of them it may send to itself, so traffic grows linearly with the number of devices
+instead of with every pair of them.
+
+New pairing requests are only accepted from addresses given with --allow, or from anyone with
+--accept-pairing, since there is nobody to answer a dialog.
+
+    python hub.py --bind 192.168.1.10 --allow 192.168.1.21 --allow 192.168.1.22
+"""
+import argparse
+import os
+from config import HUB_MAX_CONNECTIONS, HUB_FANOUT_WORKERS
+from clipboard import FakeClipboard
+from device_manager import DeviceManager
+from headless import run_until_signal
+from history import ClipboardHistory
+from network import NetworkManager
+
+def create_hub(bind_ip=None, allowed=(), accept_pairing=False):
+    device_manager = DeviceManager()
+    # A client on the same host keeps its history in the default file, so the hub needs its own
+    history = ClipboardHistory(os.path.expanduser("~/.clipboardsync/hub-history" + (f"-{bind_ip}" if bind_ip else "") + ".ring"))
+    # The hub never touches a system clipboard; the in-memory one keeps the watcher idle
+    network_manager = NetworkManager(device_manager, FakeClipboard(), history, bind_ip=bind_ip, relay=True)
+    network_manager.max_connections = HUB_MAX_CONNECTIONS
+    network_manager.fanout_workers = HUB_FANOUT_WORKERS
+    
+    def on_pairing_request(ip, hostname):
+        if accept_pairing or ip in allowed:
+            # Clients decide who gets their items, so the hub itself relays in both directions
+            device_manager.set_send_enabled(ip, True)
+            device_manager.set_receive_enabled(ip, True)
+            network_manager.send_pairing_response(ip, True)
+        else:
+            print(f"Pairing request from {hostname} ({ip}) left unanswered; restart with --allow {ip} to accept it")
+            
+    device_manager.register_pairing_callback(on_pairing_request)
+    return device_manager, network_manager
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relay clipboard items between paired devices")
+    parser.add_argument("--bind", help="local address to listen on, by default every interface")
+    parser.add_argument("--allow", action="append", default=[], metavar="IP", help="accept pairing requests from this address; can be repeated")
+    parser.add_argument("--accept-pairing", action="store_true", help="accept every pairing request")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this localhost port")
+    args = parser.parse_args()
+    
+    device_manager, network_manager = create_hub(args.bind, set(args.allow), args.accept_pairing)
+    if args.metrics_port:
+        network_manager.metrics_port = args.metrics_port
+    network_manager.start()
+    print(f"Hub listening on {network_manager.local_ip}")
+    run_until_signal(network_manager, device_manager)
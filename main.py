@@ -1,17 +1,46 @@
 ### main.py
+import argparse
+import multiprocessing
+import sys
 import threading
-from device_manager import DeviceManager
-from network import NetworkManager
-from ui import ClipboardSyncUI
 
 if __name__ == "__main__":
-    # Initialize components
-    device_manager = DeviceManager()
-    network_manager = NetworkManager(device_manager)
+    # Large payloads are processed in worker processes, which bundled apps start by running this executable
+    multiprocessing.freeze_support()
+    if "--clipboard-helper" in sys.argv[1:]:
+        # Likewise the clipboard helper process, which has no script of its own in a bundle
+        import clipboard_helper
+        clipboard_helper.main(sys.argv[1:])
+        sys.exit()
+    parser = argparse.ArgumentParser(description="Sync the clipboard between devices on the local network")
+    parser.add_argument("--headless", action="store_true", help="run without a window")
+    parser.add_argument("--accept-pairing", action="store_true", help="accept every pairing request when headless")
+    parser.add_argument("--bind", help="local address to listen on, by default every interface")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this localhost port")
+    # Bundled apps can be launched with extra arguments such as -psn_... on macOS
+    args, _ = parser.parse_known_args()
     
-    # Start network manager
-    network_manager.start()
-    
-    # Start UI
-    ui = ClipboardSyncUI(device_manager, network_manager)
-    ui.start()
\ No newline at end of file
+    if args.headless:
+        # Imported here so the headless path never loads tkinter
+        import headless
+        headless.main(args.accept_pairing, args.bind, args.metrics_port)
+    else:
+        from device_manager import DeviceManager
+        from network import NetworkManager
+        from ui import ClipboardSyncUI
+        
+        # Initialize components
+        device_manager = DeviceManager()
+        network_manager = NetworkManager(device_manager, bind_ip=args.bind)
+        if args.metrics_port:
+            network_manager.metrics_port = args.metrics_port
+        
+        # Start network manager
+        network_manager.start()
+        
+        # Start UI
+        ui = ClipboardSyncUI(device_manager, network_manager)
+        ui.start()
+        
+        # Write paired device changes that are still waiting for the background flush
+        device_manager.close()
@@ -1,6 +1,7 @@
 ### message.py
 import json
 import socket
+import struct
 import time
 import uuid
 from enum import Enum
@@ -11,20 +12,68 @@ class MessageType(Enum):
     PAIRING_RESPONSE = "pairing_response"
     CLIPBOARD_DATA = "clipboard_data"
     PING = "ping"
+    CLIPBOARD_DELTA = "clipboard_delta"
+    CLIPBOARD_ACK = "clipboard_ack"
+    CLIPBOARD_OFFER = "clipboard_offer"
+    CLIPBOARD_ITEM = "clipboard_item"
     
+# Wire ids for the binary codec. Append new types, never renumber.
+MESSAGE_TYPE_CODES = {
+    MessageType.DISCOVERY: 1,
+    MessageType.PAIRING_REQUEST: 2,
+    MessageType.PAIRING_RESPONSE: 3,
+    MessageType.CLIPBOARD_DATA: 4,
+    MessageType.PING: 5,
+    MessageType.CLIPBOARD_DELTA: 6,
+    MessageType.CLIPBOARD_ACK: 7,
+    MessageType.CLIPBOARD_OFFER: 8,
+    MessageType.CLIPBOARD_ITEM: 9
+}
+MESSAGE_TYPES_BY_CODE = {code: msg_type for msg_type, code in MESSAGE_TYPE_CODES.items()}
+
+# Binary layout: version, type, id (16 bytes), timestamp, then the lengths of the sender ip,
+# sender name, JSON metadata and raw payload sections that follow the header in that order
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("!BB16sdBHIQ")
+
 class Message:
-    def __init__(self, msg_type, data=None, sender_ip=None, sender_name=None):
+    __slots__ = ("type", "data", "sender_ip", "sender_name", "timestamp", "payload", "_id")
+    
+    def __init__(self, msg_type, data=None, sender_ip=None, sender_name=None, payload=None):
         self.type = msg_type
         self.data = data or {}
         self.sender_ip = sender_ip
         self.sender_name = sender_name
         self.timestamp = time.time()
-        self.id = str(uuid.uuid4())
+        # Raw bytes carried outside the metadata; the binary codec never escapes or re-encodes them
+        self.payload = payload
+        self._id = None
+        
+    @property
+    def id(self):
+        # Generated on first use, since most messages never need their id
+        if self._id is None:
+            self._id = str(uuid.uuid4())
+        return self._id
+        
+    @id.setter
+    def id(self, value):
+        self._id = value
+        
+    @property
+    def text(self):
+        """Clipboard text, from the raw payload or from the JSON data for older peers"""
+        if self.payload is not None:
+            return str(self.payload, "utf-8")
+        return self.data.get("text", "")
         
     def to_json(self):
+        data = self.data
+        if self.payload is not None:
+            data = dict(data, text=self.text)
         return json.dumps({
             "type": self.type.value if isinstance(self.type, MessageType) else self.type,
-            "data": self.data,
+            "data": data,
             "sender_ip": self.sender_ip,
             "sender_name": self.sender_name,
             "timestamp": self.timestamp,
@@ -46,4 +95,49 @@ class Message:
             return msg
         except Exception as e:
             print(f"Error parsing message: {e}")
-            return None
\ No newline at end of file
+            return None
+            
+    def to_bytes(self):
+        """Encode with the binary codec as a list of buffers, so the payload is never copied"""
+        sender_ip = (self.sender_ip or "").encode("utf-8")
+        sender_name = (self.sender_name or "").encode("utf-8")
+        metadata = json.dumps(self.data).encode("utf-8") if self.data else b""
+        payload = self.payload if self.payload is not None else b""
+        header = BINARY_HEADER.pack(
+            BINARY_VERSION,
+            MESSAGE_TYPE_CODES[self.type],
+            uuid.UUID(self.id).bytes,
+            self.timestamp,
+            len(sender_ip),
+            len(sender_name),
+            len(metadata),
+            len(payload)
+        )
+        return [header + sender_ip + sender_name + metadata, payload]
+        
+    @classmethod
+    def from_bytes(cls, buffer):
+        """Decode a binary message; the payload is a memoryview into buffer rather than a copy"""
+        try:
+            view = memoryview(buffer)
+            version, type_code, msg_id, timestamp, ip_len, name_len, meta_len, payload_len = BINARY_HEADER.unpack_from(view)
+            if version != BINARY_VERSION:
+                raise ValueError(f"Unsupported binary message version {version}")
+            offset = BINARY_HEADER.size
+            sender_ip = str(view[offset:offset + ip_len], "utf-8")
+            offset += ip_len
+            sender_name = str(view[offset:offset + name_len], "utf-8")
+            offset += name_len
+            data = json.loads(str(view[offset:offset + meta_len], "utf-8")) if meta_len else {}
+            offset += meta_len
+            if offset + payload_len != len(view):
+                raise ValueError("Binary message length does not match its header")
+            
+            msg = cls(MESSAGE_TYPES_BY_CODE[type_code], data, sender_ip or None, sender_name or None)
+            msg.payload = view[offset:] if payload_len else None
+            msg.timestamp = timestamp
+            msg.id = str(uuid.UUID(bytes=msg_id))
+            return msg
+        except Exception as e:
+            print(f"Error parsing binary message: {e}")
+            return None
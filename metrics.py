@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+class Counter:
+    type = "counter"
+    
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}  # label key -> value
+        self.lock = threading.Lock()
+        
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            
+    def get(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+        
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+class Gauge(Counter):
+    type = "gauge"
+    
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+class Histogram:
+    type = "histogram"
+    
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values = {}  # label key -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+        
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+            
+    def samples(self):
+        result = []
+        with self.lock:
+            for key, series in self.values.items():
+                for bound, count in zip(self.buckets, series):
+                    result.append((self.name + "_bucket", key + (("le", str(bound)),), count))
+                result.append((self.name + "_bucket", key + (("le", "+Inf"),), series[-1]))
+                result.append((self.name + "_sum", key, series[-2]))
+                result.append((self.name + "_count", key, series[-1]))
+        return result
+
+class MetricsRegistry:
+    """Named metrics, rendered in the Prometheus text exposition format"""
+    
+    def __init__(self):
+        self.metrics = []
+        
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+        
+    def counter(self, name, help):
+        return self._register(Counter(name, help))
+        
+    def gauge(self, name, help):
+        return self._register(Gauge(name, help))
+        
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, buckets))
+        
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+BYTES_SENT = registry.counter("clipboardsync_bytes_sent_total", "Bytes written to peers, including frame headers")
+BYTES_RECEIVED = registry.counter("clipboardsync_bytes_received_total", "Bytes read from peers, including frame headers")
+MESSAGES_SENT = registry.counter("clipboardsync_messages_sent_total", "Messages sent, by message type")
+MESSAGES_RECEIVED = registry.counter("clipboardsync_messages_received_total", "Messages received, by message type")
+SEND_LATENCY = registry.histogram("clipboardsync_send_latency_seconds", "Time from queueing a clipboard send to its completion")
+CONNECTION_ERRORS = registry.counter("clipboardsync_connection_errors_total", "Failed sends and connections, by kind")
+CLIPBOARD_POLL = registry.histogram("clipboardsync_clipboard_poll_seconds", "Time spent reading and hashing the local clipboard")
+DISCOVERY_PACKETS = registry.counter("clipboardsync_discovery_packets_total", "Discovery broadcasts sent and received")
+CALLBACK_TIME = registry.histogram("clipboardsync_callback_seconds", "Time spent in registered callbacks")
+ITEMS_SUPPRESSED = registry.counter("clipboardsync_items_suppressed_total", "Clipboard items neither applied nor re-broadcast, by reason")
+
+def call_timed(name, callback, *args):
+    """Run callback(*args), recording its duration under the callback label name"""
+    started = time.perf_counter()
+    try:
+        return callback(*args)
+    finally:
+        CALLBACK_TIME.observe(time.perf_counter() - started, callback=name)
+
+async def _handle_request(reader, writer):
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+        path = request.split(b" ")[1] if request.count(b" ") >= 2 else b"/"
+        if path in (b"/", b"/metrics"):
+            status, body = "200 OK", registry.render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+        writer.write(
+            f"HTTP/1.0 {status}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {len(body)}\r\n\r\n".encode("ascii")
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(port=None, unix_path=None):
+    """Serve the registry over HTTP on localhost, or on a Unix socket when unix_path is given"""
+    if unix_path:
+        return await asyncio.start_unix_server(_handle_request, unix_path)
+    return await asyncio.start_server(_handle_request, "127.0.0.1", port, reuse_address=True)
@@ -1,11 +1,27 @@
 ### network.py
+import asyncio
+import os
 import socket
 import threading
 import time
-import pyperclip
-from config import PORT, UDP_BROADCAST_PORT, PAIRING_PORT, BROADCAST_INTERVAL, BUFFER_SIZE, DEVICE_TIMEOUT
+import uuid
+from config import PORT, UDP_BROADCAST_PORT, PAIRING_PORT, BROADCAST_INTERVAL, DEVICE_TIMEOUT, MAX_PAYLOAD_SIZE
+from config import CONNECT_TIMEOUT, POOL_IDLE_TIMEOUT, FANOUT_WORKERS, SEND_DEADLINE, SEND_MIN_RATE, MAX_CONNECTIONS
+from config import DELTA_MIN_SIZE, DELTA_MAX_SIZE, DELTA_MAX_RATIO, OFFER_MIN_SIZE, DEBOUNCE_WINDOW, DEBOUNCE_MAX_DELAY
+from config import METRICS_PORT, METRICS_SOCKET, BEACON_MIN_INTERVAL, PREFER_RELAY, SPOOL_MIN_SIZE, ECHO_TRACKED_ITEMS
 from message import Message, MessageType
+from framing import read_frame, write_frame, write_unframed, start_frame_server, SpoolFile, FLAG_BINARY, FRAME_HEADER
+from connection_pool import ConnectionPool
+from clipboard import ClipboardWatcher, ClipboardItem, TEXT_PLAIN, create_clipboard_backend, content_digest, accepted_formats, format_capabilities
+from compression import supported_codecs, CODEC_MASK
+from delta import apply_delta, decode_delta
+from content_cache import ContentCache
+from offload import PayloadProcessor
+from history import ClipboardHistory
 from device_manager import DeviceStatus
+from expiry import ExpiryScheduler
+from metrics import BYTES_SENT, BYTES_RECEIVED, MESSAGES_SENT, MESSAGES_RECEIVED, SEND_LATENCY, CONNECTION_ERRORS
+from metrics import DISCOVERY_PACKETS, ITEMS_SUPPRESSED, call_timed, start_metrics_server
 
 def get_local_hostname():
     try:
@@ -14,163 +30,459 @@ def get_local_hostname():
         return "Unknown"
 
 def get_local_ip():
+    """Address of the interface that discovery broadcasts leave from"""
     try:
+        # Connecting a UDP socket only asks the kernel for a route; no packet is sent and no
+        # outside host is involved, so this never waits on the network
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        s.setblocking(False)
+        s.connect(("255.255.255.255", UDP_BROADCAST_PORT))
         ip = s.getsockname()[0]
         s.close()
-        return ip
+        return ip if ip != "0.0.0.0" else "127.0.0.1"
     except:
         return "127.0.0.1"
 
+def state_path(name, bind_ip=None):
+    """File under ~/.clipboardsync for state of this installation
+    
+    Instances bound to one address keep their own files, so several can share a host and a home directory.
+    """
+    return os.path.expanduser(f"~/.clipboardsync/{name}" + (f"-{bind_ip}" if bind_ip else ""))
+
+def load_device_id(bind_ip=None):
+    """Random id of this installation, created on first use so it survives restarts and address changes"""
+    path = state_path("device_id", bind_ip)
+    try:
+        with open(path) as f:
+            device_id = f.read().strip()
+        if device_id:
+            return device_id
+    except OSError:
+        pass
+    device_id = uuid.uuid4().hex
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(device_id)
+    except OSError as e:
+        print(f"Could not save device id, using a new one until restart: {e}")
+    return device_id
+
+def load_clock(bind_ip=None):
+    """Lamport clock saved by the previous run
+    
+    The first run starts from the wall time in milliseconds, so a new device is not ordered before
+    peers that have been copying for a while. After that only the clock itself orders items.
+    """
+    try:
+        with open(state_path("clock", bind_ip)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return int(time.time() * 1000)
+
+def save_clock(clock, bind_ip=None):
+    path = state_path("clock", bind_ip)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(str(clock))
+    except OSError as e:
+        print(f"Could not save the clipboard clock: {e}")
+
+def rebuild_text(base, delta, version):
+    """(text, encoded text) of base with delta applied, or None when the result does not match version"""
+    try:
+        text = apply_delta(base, decode_delta(delta))
+    except (ValueError, TypeError) as e:
+        print(f"Invalid delta: {e}")
+        return None
+    encoded = text.encode("utf-8")
+    if content_digest(encoded) != version:
+        return None
+    return text, encoded
+
+def decode_text(message):
+    """(text, encoded text) of a text clipboard message"""
+    if message.payload is not None:
+        return message.text, message.payload
+    text = message.text
+    return text, text.encode("utf-8")
+
+def stamp_fields(data):
+    """The origin, clock and relay fields of a clipboard message, for the messages derived from it"""
+    return {key: data[key] for key in ("origin", "clock", "recipients", "source") if key in data}
+
+# Every discovery beacon, old or new, is JSON that starts with these bytes, so anything else on the
+# discovery port can be dropped without decoding it
+BEACON_MAGIC = b'{"type": "discovery", '
+
+CLIPBOARD_MESSAGE_TYPES = (MessageType.CLIPBOARD_DATA, MessageType.CLIPBOARD_DELTA, MessageType.CLIPBOARD_OFFER, MessageType.CLIPBOARD_ITEM)
+
+class SendRejected(Exception):
+    """The peer received the item but acknowledged it with ok false; the message is its reason"""
+
+class SendResult:
+    def __init__(self, ip, success, latency, error=None, compression=None, relayed=None):
+        self.ip = ip
+        self.success = success
+        self.latency = latency  # seconds from being queued to completion
+        self.error = error
+        self.compression = compression  # CompressionStats for the frame that was sent
+        self.relayed = relayed  # peers that acknowledged the item from a hub, from the hub's acknowledgement
+        self.completed_at = time.time()
+        
+    def to_dict(self):
+        return {
+            "ip": self.ip,
+            "success": self.success,
+            "latency": self.latency,
+            "error": str(self.error) if self.error else None,
+            "compression": self.compression.to_dict() if self.compression else None,
+            "relayed": self.relayed,
+            "completed_at": self.completed_at
+        }
+
+class OutgoingPayload:
+    """A clipboard message plus the encodings already produced for peers"""
+    
+    def __init__(self, message, text, version):
+        self.message = message
+        self.text = text
+        self.version = version  # content digest of the full clipboard text
+        self.encoded = {}  # (binary, peer codecs) -> (flags, payload, stats)
+        self.peers = 0  # send queues it was handed to; only payloads sent more than once are spooled
+        
+    async def for_peer(self, capabilities, processor):
+        binary = "binary" in capabilities
+        key = (binary, tuple(sorted(capabilities)))
+        if key not in self.encoded:
+            # Peers sending at the same time wait for one encoding instead of each compressing
+            self.encoded[key] = asyncio.ensure_future(self._encode(binary, key[1], processor))
+        # Shielded so a peer whose send times out does not cancel the encoding for the others
+        return await asyncio.shield(self.encoded[key])
+        
+    async def _encode(self, binary, codecs, processor):
+        # Peers that do not understand the binary codec get the JSON form
+        data = self.message.to_bytes() if binary else self.message.to_json().encode("utf-8")
+        codec, payload, stats = await processor.compress(data, codecs)
+        if stats.wire_size >= SPOOL_MIN_SIZE and self.peers > 1:
+            # Staged once, then every peer gets it with sendfile rather than a copy through the transport.
+            # Writing the file takes as long as the disk does, so it happens on a thread.
+            parts = payload if isinstance(payload, list) else [payload]
+            payload = await asyncio.get_running_loop().run_in_executor(None, SpoolFile, parts)
+        return codec | (FLAG_BINARY if binary else 0), payload, stats
+
+class PeerSendQueue:
+    """Latest-wins outbound queue for one peer: one send in flight and at most one waiting behind it"""
+    
+    def __init__(self):
+        self.pending = None  # (payload, submitted) of the newest item not yet sent
+        self.waiters = []  # futures resolved with the SendResult that covers the pending item
+        self.worker = None
+        
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, network_manager):
+        self.network_manager = network_manager
+        
+    def datagram_received(self, data, addr):
+        self.network_manager._handle_discovery(data, addr[0])
+        
+    def error_received(self, exc):
+        print(f"Discovery listener error: {exc}")
+
 class NetworkManager:
-    def __init__(self, device_manager):
+    """Runs discovery, pairing, clipboard transfer and outgoing sends on one asyncio event loop"""
+    
+    def __init__(self, device_manager, clipboard=None, history=None, bind_ip=None, relay=False, device_id=None):
         self.device_manager = device_manager
-        self.local_ip = get_local_ip()
+        # The system clipboard backend is only created in start(), since loading it can be slow
+        self.clipboard = clipboard
+        # Binding to one address lets several instances share a host, for example in benchmarks
+        self.bind_ip = bind_ip
+        self.local_ip = bind_ip or get_local_ip()
         self.hostname = get_local_hostname()
+        # Items are ordered by (clock, origin); addresses change, so the origin is a persistent id
+        self.device_id = device_id or load_device_id(bind_ip)
+        self.clock = load_clock(bind_ip)  # Lamport clock, advanced past every clock we receive and kept across restarts
+        self.clock_lock = threading.Lock()
+        self.current_stamp = None  # (clock, origin) of the item last copied or applied, if it had one
+        self.applied_items = []  # digest sets of remote items we wrote to the clipboard that the watcher has not reported yet
+        self.applied_lock = threading.Lock()
+        self.echo_stats = {"echoes": 0, "returned": 0, "stale": 0}
         self.discovery_enabled = True
         self.sync_enabled = True
-        self.last_sent_clipboard = ""
+        self.clipboard_watcher = None
         self.running = True
         self.notification_callbacks = []
+        self.max_payload_size = MAX_PAYLOAD_SIZE
+        self.send_deadline = SEND_DEADLINE
+        port = os.environ.get("CLIPBOARDSYNC_METRICS_PORT")
+        self.metrics_port = int(port) if port else METRICS_PORT
+        self.metrics_socket = METRICS_SOCKET
+        self.capabilities = supported_codecs() + ["binary", "delta", "offer"]  # advertised to peers in discovery and pairing messages
+        # A relay (hub) forwards received items to its other peers instead of applying them locally
+        self.relay = relay
+        self.prefer_relay = PREFER_RELAY
+        self.relay_versions = {}  # ip -> digest the peer sent us or has queued from us, so it is never sent back
+        self.relay_reached = {}  # origin ip -> peers that acknowledged its last item from us, reported in our acknowledgement
+        self.relay_stats = {"relayed": 0, "fanout": 0, "skipped": 0}
+        if relay:
+            self.capabilities.append("relay")
+        self.compression_totals = {"messages": 0, "original_bytes": 0, "wire_bytes": 0, "cpu_time": 0.0}
+        self.sent_versions = {}  # ip -> (digest, text) the peer last acknowledged
+        self.received_versions = {}  # ip -> (digest, text) the peer last sent us
+        self.delta_stats = {"deltas": 0, "full": 0, "mismatches": 0, "bytes_saved": 0}
+        self.content_cache = ContentCache()
+        # Hashing, compressing and decompressing large payloads happens in worker processes
+        self.processor = PayloadProcessor()
+        self.offer_stats = {"offers": 0, "bodies_skipped": 0, "bytes_skipped": 0}
+        # Formats a peer did not advertise are left out of what it is sent
+        self.format_stats = {"items": 0, "formats_dropped": 0, "bytes_dropped": 0, "peers_skipped": 0}
+        self.history = history if history is not None else ClipboardHistory()
+        self.connection_pool = ConnectionPool(PORT, local_ip=bind_ip)
+        self.send_results = {}  # ip -> SendResult of the latest send
+        self.send_result_callbacks = []
+        self.send_queues = {}  # ip -> PeerSendQueue
+        self.queue_stats = {"debounced": 0, "coalesced": 0, "dropped": 0, "superseded": 0}
+        self.debounce_window = DEBOUNCE_WINDOW
+        self.debounce_timer = None
+        self.debounce_started = 0
+        self.debounce_item = None
+        self.active_connections = 0
+        self.max_connections = MAX_CONNECTIONS
+        self.fanout_workers = FANOUT_WORKERS
+        self.beacon = None  # encoded once the loop starts, then reused for every broadcast and reply
+        self.beacon_transport = None
+        self.beacon_interval = BEACON_MIN_INTERVAL
+        self.beacon_wakeup = None
+        self.last_beacon = 0
+        # Paired devices go offline once DEVICE_TIMEOUT passes without a heartbeat
+        self.device_expiry = ExpiryScheduler(DEVICE_TIMEOUT, self._on_device_expired)
+        self.device_manager.register_device_seen_callback(self.device_expiry.touch)
+        self.loop = None
+        self.ready = threading.Event()
+        self.stopped = None
+        self.send_semaphore = None
         
     def register_notification_callback(self, callback):
         self.notification_callbacks.append(callback)
         
     def notify(self, title, message):
         for callback in self.notification_callbacks:
-            callback(title, message)
+            call_timed("notification", callback, title, message)
             
     def start(self):
-        # Start all network threads
-        threading.Thread(target=self._broadcast_presence, daemon=True).start()
-        threading.Thread(target=self._listen_for_discovery, daemon=True).start()
-        threading.Thread(target=self._listen_for_pairing, daemon=True).start()
-        threading.Thread(target=self._clipboard_server, daemon=True).start()
-        threading.Thread(target=self._monitor_clipboard, daemon=True).start()
-        threading.Thread(target=self._check_device_timeouts, daemon=True).start()
+        # The event loop runs every socket; the clipboard watcher keeps its own thread
+        self.clipboard = self.clipboard or create_clipboard_backend()
+        self.clipboard_watcher = ClipboardWatcher(self.clipboard, self._on_clipboard_change)
+        # Peers learn which formats we accept from discovery and pairing, so add them before serving
+        self.capabilities += format_capabilities(self.clipboard.formats)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run_loop, name="network", daemon=True).start()
+        self.ready.wait()
+        self.clipboard_watcher.start()
         
     def stop(self):
         self.running = False
+        if self.clipboard_watcher:
+            self.clipboard_watcher.stop()
+        if self.loop and self.stopped and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+        self.processor.close()
+            
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        except Exception as e:
+            print(f"Network loop error: {e}")
+        finally:
+            self.ready.set()
+            self.loop.close()
+            self.history.close()
+            
+    def _run_coroutine(self, coro):
+        """Schedule a coroutine on the network loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+        
+    async def _serve(self):
+        self.stopped = asyncio.Event()
+        self.send_semaphore = asyncio.Semaphore(self.fanout_workers)
         
-    def _broadcast_presence(self):
-        """Broadcasts device presence for discovery"""
+        discovery_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        discovery_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        discovery_sock.bind(("", UDP_BROADCAST_PORT))
+        discovery, _ = await self.loop.create_datagram_endpoint(lambda: DiscoveryProtocol(self), sock=discovery_sock)
+        broadcaster, _ = await self.loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, family=socket.AF_INET, allow_broadcast=True
+        )
+        pairing_server = await asyncio.start_server(self._handle_pairing_connection, self.bind_ip, PAIRING_PORT, reuse_address=True)
+        clipboard_server = await start_frame_server(
+            self._handle_clipboard_connection, self.bind_ip, PORT, self.max_payload_size, SPOOL_MIN_SIZE
+        )
+        servers = [pairing_server, clipboard_server]
+        if self.metrics_port or self.metrics_socket:
+            try:
+                servers.append(await start_metrics_server(self.metrics_port, self.metrics_socket))
+            except OSError as e:
+                print(f"Metrics endpoint unavailable: {e}")
+        
+        self.beacon_transport = broadcaster
+        self.beacon_wakeup = asyncio.Event()
+        self.beacon = Message(
+            MessageType.DISCOVERY,
+            {"capabilities": self.capabilities},
+            self.local_ip,
+            self.hostname
+        ).to_json().encode("utf-8")
+        tasks = [self.loop.create_task(self._broadcast_presence())]
+        self.device_expiry.start(self.loop)
+        self.ready.set()
+        
+        try:
+            await self.stopped.wait()
+        finally:
+            self.device_expiry.stop()
+            for server in servers:
+                server.close()
+            discovery.close()
+            broadcaster.close()
+            self.connection_pool.close_all()
+            # Cancel sends and connection handlers that are still in flight
+            current = asyncio.current_task()
+            pending = [task for task in asyncio.all_tasks() if task is not current]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            
+    async def _broadcast_presence(self):
+        """Broadcasts device presence for discovery, quickly while the set of peers changes"""
         while self.running:
             if self.discovery_enabled:
-                with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as sock:
-                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-                    msg = Message(
-                        MessageType.DISCOVERY,
-                        {},
-                        self.local_ip,
-                        self.hostname
-                    )
-                    try:
-                        sock.sendto(msg.to_json().encode("utf-8"), ("<broadcast>", UDP_BROADCAST_PORT))
-                    except Exception as e:
-                        print(f"Broadcast error: {e}")
-            time.sleep(BROADCAST_INTERVAL)
+                self._send_beacon("<broadcast>")
+            # Each quiet interval doubles the next one, up to BROADCAST_INTERVAL
+            interval = self.beacon_interval
+            self.beacon_interval = min(interval * 2, BROADCAST_INTERVAL)
+            self.beacon_wakeup.clear()
+            try:
+                await asyncio.wait_for(self.beacon_wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+                
+    def _send_beacon(self, address):
+        try:
+            self.beacon_transport.sendto(self.beacon, (address, UDP_BROADCAST_PORT))
+            self.last_beacon = time.monotonic()
+            DISCOVERY_PACKETS.inc(direction="sent")
+        except Exception as e:
+            print(f"Broadcast error: {e}")
             
-    def _listen_for_discovery(self):
-        """Listens for discovery broadcasts from other devices"""
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            sock.bind(("", UDP_BROADCAST_PORT))
+    def _speed_up_beacons(self):
+        """Return to fast beacons because a peer appeared or went missing"""
+        self.beacon_interval = BEACON_MIN_INTERVAL
+        # Send right away unless a beacon just went out, so a burst of new peers cannot cause a storm
+        if self.beacon_wakeup and time.monotonic() - self.last_beacon >= BEACON_MIN_INTERVAL:
+            self.beacon_wakeup.set()
+            
+    def _handle_discovery(self, data, ip):
+        """Handle a discovery broadcast from another device"""
+        if ip == self.local_ip:
+            return
+        if not data.startswith(BEACON_MAGIC):
+            DISCOVERY_PACKETS.inc(direction="rejected")
+            return
+            
+        DISCOVERY_PACKETS.inc(direction="received")
+        try:
+            message = Message.from_json(data)
+            if not message or message.type != MessageType.DISCOVERY:
+                return
+                
+            capabilities = message.data.get("capabilities", [])
+            device = self.device_manager.get_device(ip)
+            if device and device.status == DeviceStatus.PAIRED:
+                # Already paired device, just update last seen
+                self.device_manager.add_or_update_device(ip, message.sender_name, capabilities=capabilities)
+            elif device and device.status == DeviceStatus.DISCONNECTED and not device.manually_disconnected:
+                # Previously paired and not manually disconnected, now reconnected
+                self.device_manager.add_or_update_device(ip, message.sender_name, DeviceStatus.PAIRED, capabilities)
+                self.notify("Device Reconnected", f"{message.sender_name} ({ip}) is back online")
+                # Answer directly so the peer sees us now rather than at our next broadcast
+                self._send_beacon(ip)
+                self._speed_up_beacons()
+            elif not device and self.discovery_enabled:
+                # New device discovered
+                self.device_manager.add_or_update_device(ip, message.sender_name, capabilities=capabilities)
+                self._send_beacon(ip)
+                self._speed_up_beacons()
+                # Automatically request pairing
+                self._request_pairing(ip)
+                
+        except Exception as e:
+            print(f"Error processing discovery from {ip}: {e}")
+            
+    async def _send_pairing_message(self, ip, msg):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, PAIRING_PORT, local_addr=self.connection_pool.local_addr), CONNECT_TIMEOUT
+        )
+        try:
+            data = msg.to_json().encode("utf-8")
+            device = self.device_manager.get_device(ip)
+            # Peers from before framing advertise no capabilities and read the bare JSON
+            write = write_frame if device and device.capabilities else write_unframed
+            await asyncio.wait_for(write(writer, data, max_size=self.max_payload_size), CONNECT_TIMEOUT)
+            self._count_sent(ip, msg.type, len(data))
+        finally:
+            writer.close()
             
-            while self.running:
-                try:
-                    data, addr = sock.recvfrom(BUFFER_SIZE)
-                    ip = addr[0]
-                    
-                    if ip == self.local_ip:
-                        continue
-                        
-                    try:
-                        message = Message.from_json(data.decode("utf-8"))
-                        if not message or message.type != MessageType.DISCOVERY:
-                            continue
-                            
-                        device = self.device_manager.get_device(ip)
-                        if device and device.status == DeviceStatus.PAIRED:
-                            # Already paired device, just update last seen
-                            self.device_manager.add_or_update_device(ip, message.sender_name)
-                        elif device and device.status == DeviceStatus.DISCONNECTED and not device.manually_disconnected:
-                            # Previously paired and not manually disconnected, now reconnected
-                            self.device_manager.add_or_update_device(ip, message.sender_name, DeviceStatus.PAIRED)
-                            self.notify("Device Reconnected", f"{message.sender_name} ({ip}) is back online")
-                        elif not device and self.discovery_enabled:
-                            # New device discovered
-                            self.device_manager.add_or_update_device(ip, message.sender_name)
-                            # Automatically request pairing
-                            self._request_pairing(ip)
-                            
-                    except Exception as e:
-                        print(f"Error processing discovery from {ip}: {e}")
-                        
-                except Exception as e:
-                    print(f"Discovery listener error: {e}")
-    
     def _request_pairing(self, ip):
         """Send pairing request to a device"""
+        self._run_coroutine(self._request_pairing_async(ip))
+        
+    async def _request_pairing_async(self, ip):
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(5)
-                sock.connect((ip, PAIRING_PORT))
-                msg = Message(
-                    MessageType.PAIRING_REQUEST,
-                    {},
-                    self.local_ip,
-                    self.hostname
-                )
-                sock.sendall(msg.to_json().encode("utf-8"))
-                self.notify("Pairing Request Sent", f"Sent pairing request to {ip}")
+            msg = Message(
+                MessageType.PAIRING_REQUEST,
+                {"capabilities": self.capabilities},
+                self.local_ip,
+                self.hostname
+            )
+            await self._send_pairing_message(ip, msg)
+            self.notify("Pairing Request Sent", f"Sent pairing request to {ip}")
         except Exception as e:
             print(f"Error sending pairing request to {ip}: {e}")
             
-    def _listen_for_pairing(self):
-        """Listen for pairing requests and responses"""
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
-            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            server.bind(("", PAIRING_PORT))
-            server.listen(5)
-            server.settimeout(1)  # Allow checking self.running
-            
-            while self.running:
-                try:
-                    conn, addr = server.accept()
-                    threading.Thread(target=self._handle_pairing_connection, args=(conn, addr), daemon=True).start()
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    print(f"Pairing server error: {e}")
-                    time.sleep(1)
-                    
-    def _handle_pairing_connection(self, conn, addr):
+    async def _handle_pairing_connection(self, reader, writer):
         """Handle an incoming pairing connection"""
+        addr = writer.get_extra_info("peername")
         try:
-            conn.settimeout(5)
-            data = conn.recv(BUFFER_SIZE)
-            if not data:
+            frame = await asyncio.wait_for(read_frame(reader, self.max_payload_size), CONNECT_TIMEOUT)
+            if not frame:
                 return
                 
-            message = Message.from_json(data.decode("utf-8"))
+            ip = addr[0]
+            message = Message.from_json(frame[1])
+            self._count_received(ip, message, len(frame[1]))
             if not message:
                 return
                 
-            ip = addr[0]
+            capabilities = message.data.get("capabilities", [])
             
             if message.type == MessageType.PAIRING_REQUEST:
                 # Received pairing request
                 if self.discovery_enabled:
-                    device = self.device_manager.add_or_update_device(ip, message.sender_name)
-                    device.pairing_pending = True
-                    self.device_manager.handle_pairing_request(ip, message.sender_name)
-                
+                    self.device_manager.add_or_update_device(ip, message.sender_name, capabilities=capabilities)
+                    self.device_manager.set_pairing_pending(ip, True)
+                    # Pairing callbacks may block on a dialog, so keep them off the event loop
+                    self.loop.run_in_executor(None, self.device_manager.handle_pairing_request, ip, message.sender_name)
+                    
             elif message.type == MessageType.PAIRING_RESPONSE:
                 # Received response to our pairing request
                 accepted = message.data.get("accepted", False)
                 if accepted:
-                    self.device_manager.add_or_update_device(ip, message.sender_name, DeviceStatus.PAIRED)
+                    self.device_manager.add_or_update_device(ip, message.sender_name, DeviceStatus.PAIRED, capabilities)
                     self.notify("Pairing Accepted", f"{message.sender_name} ({ip}) accepted your pairing request")
                 else:
                     self.notify("Pairing Rejected", f"{message.sender_name} ({ip}) rejected your pairing request")
@@ -178,138 +490,651 @@ class NetworkManager:
         except Exception as e:
             print(f"Error handling pairing from {addr}: {e}")
         finally:
-            conn.close()
+            writer.close()
             
     def send_pairing_response(self, ip, accepted):
         """Send response to a pairing request"""
+        self._run_coroutine(self._send_pairing_response_async(ip, accepted))
+        
+    async def _send_pairing_response_async(self, ip, accepted):
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(5)
-                sock.connect((ip, PAIRING_PORT))
-                msg = Message(
-                    MessageType.PAIRING_RESPONSE,
-                    {"accepted": accepted},
-                    self.local_ip,
-                    self.hostname
-                )
-                sock.sendall(msg.to_json().encode("utf-8"))
-                
-                if accepted:
-                    self.device_manager.accept_pairing(ip)
-                    self.notify("Pairing Completed", f"You are now paired with {ip}")
-                else:
-                    self.device_manager.reject_pairing(ip)
+            msg = Message(
+                MessageType.PAIRING_RESPONSE,
+                {"accepted": accepted, "capabilities": self.capabilities},
+                self.local_ip,
+                self.hostname
+            )
+            await self._send_pairing_message(ip, msg)
+            
+            if accepted:
+                self.device_manager.accept_pairing(ip)
+                self.notify("Pairing Completed", f"You are now paired with {ip}")
+            else:
+                self.device_manager.reject_pairing(ip)
         except Exception as e:
             print(f"Error sending pairing response to {ip}: {e}")
             
-    def _clipboard_server(self):
-        """Server to receive clipboard data"""
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
-            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            server.bind(("", PORT))
-            server.listen(5)
-            server.settimeout(1)  # Allow checking self.running
+    async def _handle_clipboard_connection(self, connection):
+        """Handle a clipboard connection, which stays open for as long as the sender keeps it pooled"""
+        addr = connection.get_extra_info("peername")
+        if self.active_connections >= self.max_connections:
+            print(f"Refusing clipboard connection from {addr}: too many connections")
+            connection.close()
+            return
             
+        self.active_connections += 1
+        try:
+            ip = addr[0]
             while self.running:
-                try:
-                    conn, addr = server.accept()
-                    threading.Thread(target=self._handle_clipboard_connection, args=(conn, addr), daemon=True).start()
-                except socket.timeout:
+                # Senders keep connections open, so only give up after the pool's idle timeout
+                frame = await asyncio.wait_for(connection.read_frame(), POOL_IDLE_TIMEOUT + CONNECT_TIMEOUT)
+                if not frame:
+                    return
+                    
+                message = await self._decode_frame(*frame)
+                self._count_received(ip, message, len(frame[1]))
+                if not message or message.type not in CLIPBOARD_MESSAGE_TYPES:
                     continue
-                except Exception as e:
-                    print(f"Clipboard server error: {e}")
-                    time.sleep(1)
                     
-    def _handle_clipboard_connection(self, conn, addr):
-        """Handle incoming clipboard data"""
-        try:
-            ip = addr[0]
-            conn.settimeout(5)
-            data = conn.recv(BUFFER_SIZE)
-            if not data:
-                return
-                
-            message = Message.from_json(data.decode("utf-8"))
-            if not message or message.type != MessageType.CLIPBOARD_DATA:
-                return
-                
-            if not self.sync_enabled:
-                print(f"Ignoring clipboard from {ip}: sync disabled")
-                return
-                
-            if not self.device_manager.is_allowed_to_send(ip):
-                print(f"Ignoring clipboard from {ip}: not allowed to send")
-                return
-                
-            text = message.data.get("text", "")
-            if text != self.last_sent_clipboard:
-                pyperclip.copy(text)
-                device = self.device_manager.get_device(ip)
-                hostname = device.hostname if device else "Unknown"
-                self.notify("Clipboard Updated", f"Received clipboard from {hostname} ({ip})")
-                
+                ok, reason = await self._handle_clipboard_message(message, ip)
+                if message.data.get("ack"):
+                    fields = {"ref": message.id, "ok": ok, "reason": reason}
+                    if self.relay and ok:
+                        # The origin sends directly to the recipients that did not get the item from us
+                        fields["relayed"] = self.relay_reached.pop(ip, [])
+                    ack = Message(
+                        MessageType.CLIPBOARD_ACK,
+                        fields,
+                        self.local_ip,
+                        self.hostname
+                    )
+                    data = ack.to_json().encode("utf-8")
+                    await write_frame(connection, data)
+                    self._count_sent(ip, ack.type, len(data))
+                    
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Idle past the pool timeout, or cancelled on shutdown
+            pass
         except Exception as e:
             print(f"Error handling clipboard from {addr}: {e}")
+            CONNECTION_ERRORS.inc(peer=addr[0], kind="receive")
         finally:
-            conn.close()
+            self.active_connections -= 1
+            connection.close()
+            
+    def _count_sent(self, ip, message_type, size):
+        BYTES_SENT.inc(size + FRAME_HEADER.size, peer=ip)
+        MESSAGES_SENT.inc(type=message_type.value)
+        
+    def _count_received(self, ip, message, size):
+        BYTES_RECEIVED.inc(size + FRAME_HEADER.size, peer=ip)
+        MESSAGES_RECEIVED.inc(type=message.type.value if message else "invalid")
+        
+    async def _decode_frame(self, flags, payload):
+        payload = await self.processor.decompress(payload, flags & CODEC_MASK, self.max_payload_size)
+        return Message.from_bytes(payload) if flags & FLAG_BINARY else Message.from_json(payload)
+        
+    async def _handle_clipboard_message(self, message, ip):
+        """Apply a received clipboard message, returning (ok, reason) for the acknowledgement"""
+        stamp = self._message_stamp(message)
+        if stamp:
+            # Even items we go on to ignore move the clock on, so our next copy is ordered after them
+            self._observe_clock(stamp[0])
+            
+        if not self.sync_enabled:
+            print(f"Ignoring clipboard from {ip}: sync disabled")
+            return False, "sync_disabled"
             
+        if not self.device_manager.is_allowed_to_send(ip):
+            print(f"Ignoring clipboard from {ip}: not allowed to send")
+            return False, "not_allowed"
+            
+        device = self.device_manager.get_device(ip)
+        if device and "relay" in device.capabilities:
+            # A hub passes on items from its other clients, which need our permission as well as the hub
+            source = message.data.get("source")
+            if not isinstance(source, str) or not self.device_manager.is_allowed_to_send(source):
+                print(f"Ignoring clipboard relayed by {ip} from {source}: not allowed to send")
+                return False, "not_allowed"
+                
+        if stamp:
+            if stamp[1] == self.device_id:
+                # Our own item, sent back by a peer that applied it
+                self._count_suppressed("returned")
+                return False, "returned"
+            if self.current_stamp and stamp <= self.current_stamp:
+                # Ordered before what the clipboard holds: the losing side of two copies made at once, since
+                # a peer that saw our item stamps its next copy with a higher clock
+                self._count_suppressed("stale")
+                return False, "stale"
+                
+        if message.type == MessageType.CLIPBOARD_ITEM:
+            item = self._item_from_message(message)
+            if item is None:
+                return False, "invalid"
+            digest = item.digest = await self.processor.digest(item.formats)
+            text = await self.processor.call(len(item.formats.get(TEXT_PLAIN, b"")), getattr, item, "text")
+        else:
+            if message.type == MessageType.CLIPBOARD_OFFER:
+                # The sender announced a digest; only ask for the body when we do not already hold it
+                digest = message.data.get("version")
+                text = self.content_cache.get(digest)
+                if text is None:
+                    return False, "need"
+                item = ClipboardItem({TEXT_PLAIN: await self.processor.call(len(text), text.encode, "utf-8")})
+            elif message.type == MessageType.CLIPBOARD_DELTA:
+                rebuilt = await self._apply_received_delta(message, ip)
+                if rebuilt is None:
+                    return False, "base_mismatch"
+                text, encoded = rebuilt
+                digest = message.data["version"]
+                item = ClipboardItem({TEXT_PLAIN: encoded})
+            else:
+                # Binary messages already carry the encoded text, so it is neither encoded again nor copied
+                text, encoded = await self.processor.call(len(message.payload or b""), decode_text, message)
+                item = ClipboardItem({TEXT_PLAIN: encoded})
+                digest = await self.processor.digest(item.formats)
+            item.digest = digest
+            # Remember what this peer last sent us, which is the base for its next delta
+            if len(text) <= DELTA_MAX_SIZE:
+                self.received_versions[ip] = (digest, text)
+            self.content_cache.put(digest, text)
+        if stamp:
+            # Relays pass the stamp on unchanged, so every device orders the item the same way
+            item.clock, item.origin = stamp
+        self.current_stamp = stamp
+        
+        if text is not None:
+            # History keeps the text; other formats only live on the clipboard
+            await self.processor.call(len(text), self.history.append, text, ip, False, None, digest if len(item.formats) == 1 else None)
+        if self.relay:
+            sends = self._relay_clipboard(item, ip, message.data.get("recipients"))
+            if message.data.get("ack"):
+                # Only peers that acknowledged the item count as reached; the origin sends to the others itself
+                results = await asyncio.gather(*sends)
+                self.relay_reached[ip] = [result.ip for result in results if result.success]
+            return True, None
+            
+        if digest != self.clipboard_watcher.last_digest:
+            await self._expect_echo(item)
+            # Clipboard backends can block, for example while spawning xclip
+            await self.loop.run_in_executor(None, self.clipboard.copy_item, item)
+            device = self.device_manager.get_device(ip)
+            hostname = device.hostname if device else "Unknown"
+            self.notify("Clipboard Updated", f"Received clipboard from {hostname} ({ip})")
+        return True, None
+        
+    def _message_stamp(self, message):
+        """(clock, origin) of a received clipboard message, or None from peers that do not stamp items"""
+        clock, origin = message.data.get("clock"), message.data.get("origin")
+        if not isinstance(clock, int) or not isinstance(origin, str):
+            return None
+        return clock, origin
+        
+    def _stamp(self, item):
+        """Mark item as a new copy on this device, ordered after everything seen so far"""
+        with self.clock_lock:
+            self.clock += 1
+            item.origin, item.clock = self.device_id, self.clock
+            self.current_stamp = (item.clock, item.origin)
+            save_clock(self.clock, self.bind_ip)
+        return item
+        
+    def _observe_clock(self, clock):
+        with self.clock_lock:
+            if clock > self.clock:
+                self.clock = clock
+                save_clock(self.clock, self.bind_ip)
+                
+    def _shares_copies(self):
+        """True when a local copy would be sent to at least one peer"""
+        return self.sync_enabled and any(
+            device.status == DeviceStatus.PAIRED and device.send_enabled
+            for device in self.device_manager.get_active_devices()
+        )
+        
+    def _count_suppressed(self, reason):
+        self.echo_stats[reason] += 1
+        ITEMS_SUPPRESSED.inc(reason=reason)
+        
+    async def _expect_echo(self, item):
+        """Remember a remote item we are writing to the clipboard, so the watcher does not report it as a local copy"""
+        digests = {item.digest}
+        # Backends that cannot hold every format report only the part they wrote, for example the image alone
+        stored = self.clipboard.stored_item(item)
+        if stored is not None and stored is not item:
+            digests.add(await self.processor.digest(stored.formats))
+        with self.applied_lock:
+            self.applied_items.append(digests)
+            del self.applied_items[:-ECHO_TRACKED_ITEMS]
+            
+    def _take_echo(self, item):
+        """True when the watcher reported a remote item we applied rather than a local copy"""
+        digest = item.digest
+        with self.applied_lock:
+            for index, digests in enumerate(self.applied_items):
+                if digest in digests:
+                    # Items applied before it were overwritten before the watcher saw them
+                    del self.applied_items[:index + 1]
+                    return True
+            # A local copy replaced whatever we applied
+            self.applied_items.clear()
+        return False
+        
+    def _item_from_message(self, message):
+        """Split a CLIPBOARD_ITEM payload into its formats, as views into the received buffer"""
+        view = memoryview(message.payload if message.payload is not None else b"")
+        formats = {}
+        offset = 0
+        try:
+            for mime, length in message.data["formats"]:
+                formats[mime] = view[offset:offset + length]
+                offset += length
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not formats or offset != len(view):
+            return None
+        return ClipboardItem(formats)
+        
+    def _relay_clipboard(self, item, origin_ip, recipients):
+        """Forward an item to the recipients its origin named, among the peers we may send to
+        
+        Peers already holding the item are skipped. Origins that name no recipients get nothing
+        relayed, since we cannot tell which peers they are allowed to send to. Returns the futures
+        for the SendResults of the forwarded copies.
+        """
+        digest = item.digest
+        self.relay_versions[origin_ip] = digest
+        recipients = set(recipients) if isinstance(recipients, list) else set()
+        sends = []
+        payloads = {}
+        # Receivers check their own permissions for the origin, which they cannot see behind us
+        fields = {"source": origin_ip}
+        for device in self.device_manager.get_active_devices():
+            if device.ip == origin_ip or device.ip not in recipients:
+                continue
+            if device.status != DeviceStatus.PAIRED or not device.send_enabled:
+                continue
+            if self.relay_versions.get(device.ip) == digest:
+                # Usually a client echoing an item we just relayed to it
+                self.relay_stats["skipped"] += 1
+                continue
+            # Encoded once per set of accepted formats and shared by every peer queue
+            payload = self._payload_for_device(item, device, payloads, fields)
+            if payload is None:
+                continue
+            self.relay_versions[device.ip] = digest
+            sends.append(self._enqueue_send(device.ip, payload))
+            self.relay_stats["fanout"] += 1
+        self.relay_stats["relayed"] += 1
+        return sends
+        
+    async def _apply_received_delta(self, message, ip):
+        """Rebuild (text, encoded text) from a delta, or return None when we do not hold its base"""
+        base = self.received_versions.get(ip)
+        if not base or base[0] != message.data.get("base"):
+            return None
+        # Applying, encoding and hashing are as slow as the full text is long, so large ones leave the loop
+        return await self.processor.call(len(base[1]), rebuild_text, base[1], message.text, message.data.get("version"))
+        
     def send_clipboard_to_device(self, ip):
         """Send clipboard to a specific device"""
-        text = pyperclip.paste()
-        self._send_clipboard_to_ip(ip, text)
+        item = self.clipboard.paste_item()
+        device = self.device_manager.get_device(ip)
+        if item and device and self.device_manager.can_send_to(ip):
+            self._stamp(item)
+            payload = self._payload_for_device(item, device, {})
+            if payload:
+                self._run_coroutine(self._send_queued(ip, payload))
+                
+    def _payload_for_device(self, item, device, payloads, fields=None):
+        """Encode the formats of item that device accepts, reusing payloads (accepted formats -> payload)
         
-    def _send_clipboard_to_ip(self, ip, text):
-        """Send clipboard text to specific IP"""
-        if not text:
-            return
+        fields are added to the message, for example the recipients a hub may relay the item to.
+        Returns None when the device accepts none of them.
+        """
+        accepted = item.filtered(accepted_formats(device.capabilities))
+        if accepted is None:
+            self.format_stats["peers_skipped"] += 1
+            return None
+        if accepted is not item:
+            self.format_stats["formats_dropped"] += len(item.formats) - len(accepted.formats)
+            self.format_stats["bytes_dropped"] += item.size - accepted.size
+        key = frozenset(accepted.formats)
+        if key not in payloads:
+            payloads[key] = self._item_payload(accepted, fields)
+        return payloads[key]
+        
+    def _item_payload(self, item, fields=None):
+        """Encode a clipboard item once, using the text message when text is all it carries"""
+        text = item.text
+        stamp = {"origin": item.origin, "clock": item.clock} if item.origin else {}
+        stamp.update(fields or {})
+        if text is not None and len(item.formats) == 1:
+            return self._clipboard_payload(item, stamp)
+        self.format_stats["items"] += 1
+        mimes = list(item.formats)
+        msg = Message(
+            MessageType.CLIPBOARD_ITEM,
+            dict(stamp, version=item.digest, formats=[[mime, len(item.formats[mime])] for mime in mimes], ack=True),
+            self.local_ip,
+            self.hostname,
+            # Sent raw by the binary codec; only peers that advertise a format besides text get this message
+            b"".join(item.formats[mime] for mime in mimes)
+        )
+        return OutgoingPayload(msg, text, item.digest)
             
-        if not self.device_manager.can_send_to(ip):
-            return
+    def _clipboard_payload(self, item, stamp):
+        """Encode a text-only item once so it can be sent to many peers"""
+        text = item.text
+        # The item's digest and encoded text were already computed when it was copied or received
+        version = item.digest
+        self.content_cache.put(version, text)
+        msg = Message(
+            MessageType.CLIPBOARD_DATA,
+            dict(stamp, version=version, ack=True),
+            self.local_ip,
+            self.hostname,
+            item.formats[TEXT_PLAIN]
+        )
+        return OutgoingPayload(msg, text, version)
+        
+    async def _delta_payload(self, ip, payload):
+        """Build a delta against the version ip last acknowledged, or None when a full send is smaller"""
+        base = self.sent_versions.get(ip)
+        if not base or base[0] == payload.version or len(payload.text) < DELTA_MIN_SIZE:
+            return None
+        # Diffing large texts takes a while, so it runs through the processor like compression
+        encoded = await self.processor.delta(base[1], payload.text, len(payload.message.payload) * DELTA_MAX_RATIO)
+        if encoded is None:
+            return None
+        msg = Message(
+            MessageType.CLIPBOARD_DELTA,
+            dict(stamp_fields(payload.message.data), base=base[0], version=payload.version, ack=True),
+            self.local_ip,
+            self.hostname,
+            encoded
+        )
+        return OutgoingPayload(msg, payload.text, payload.version)
+        
+    def _offer_payload(self, payload):
+        msg = Message(
+            MessageType.CLIPBOARD_OFFER,
+            dict(stamp_fields(payload.message.data), version=payload.version, size=len(payload.message.payload), ack=True),
+            self.local_ip,
+            self.hostname
+        )
+        return OutgoingPayload(msg, payload.text, payload.version)
+        
+    async def _send_queued(self, ip, payload):
+        return await self._enqueue_send(ip, payload)
+        
+    def _send_timeout(self, payload):
+        """Seconds a send of payload may take: the fixed deadline plus transfer time at the slowest rate we accept"""
+        size = len(payload.message.payload) if payload.message.payload is not None else 0
+        return self.send_deadline + size / SEND_MIN_RATE
+        
+    def _enqueue_send(self, ip, payload):
+        """Queue payload for ip, replacing any older item still waiting, and return a future for its SendResult"""
+        queue = self.send_queues.get(ip)
+        if queue is None:
+            queue = self.send_queues[ip] = PeerSendQueue()
+        if queue.pending:
+            # The waiting item is stale now; its callers get the result of the newer send instead
+            self.queue_stats["coalesced"] += 1
+        payload.peers += 1
+        queue.pending = (payload, time.monotonic())
+        waiter = self.loop.create_future()
+        queue.waiters.append(waiter)
+        if not queue.worker:
+            queue.worker = self.loop.create_task(self._drain_send_queue(ip, queue))
+        return waiter
+        
+    async def _drain_send_queue(self, ip, queue):
+        try:
+            while queue.pending:
+                payload, submitted = queue.pending
+                waiters = queue.waiters
+                queue.pending, queue.waiters = None, []
+                # Waiting behind the previous send does not count against the deadline: only the newest
+                # item ever waits, and a large send ahead of it would otherwise make it expire
+                deadline = time.monotonic() + self._send_timeout(payload)
+                if not self.device_manager.can_send_to(ip):
+                    # The peer was unpaired or had sending turned off while the previous send ran
+                    self.queue_stats["dropped"] += 1
+                    result = SendResult(ip, False, time.monotonic() - submitted, ConnectionError("Dropped from the send queue"))
+                    self._record_send_result(result)
+                else:
+                    result = await self._send_to_peer(ip, payload, deadline, submitted)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(result)
+        finally:
+            queue.worker = None
             
+    async def _send_to_peer(self, ip, payload, deadline, submitted=None):
+        """Send a clipboard message to one peer within the deadline and report the outcome"""
+        submitted = submitted or time.monotonic()
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(5)
-                sock.connect((ip, PORT))
-                
-                msg = Message(
-                    MessageType.CLIPBOARD_DATA,
-                    {"text": text},
-                    self.local_ip,
-                    self.hostname
-                )
-                sock.sendall(msg.to_json().encode("utf-8"))
-                
-                device = self.device_manager.get_device(ip)
+            device = self.device_manager.get_device(ip)
+            capabilities = device.capabilities if device else []
+            stats, ack = await asyncio.wait_for(self._send_locked(ip, payload, capabilities), max(deadline - time.monotonic(), 0))
+            if ack and not ack.data.get("ok"):
+                # Delivered but not applied, for example because the peer does not accept items from us
+                reason = ack.data.get("reason") or "rejected"
+                print(f"Clipboard sent to {ip} was not applied: {reason}")
+                result = SendResult(ip, False, time.monotonic() - submitted, SendRejected(reason), compression=stats)
+            else:
+                relayed = ack.data.get("relayed") if ack else None
+                result = SendResult(ip, True, time.monotonic() - submitted, compression=stats, relayed=relayed)
                 hostname = device.hostname if device else "Unknown"
                 self.notify("Clipboard Sent", f"Sent clipboard to {hostname} ({ip})")
-                
+        except asyncio.TimeoutError as e:
+            print(f"Failed to send clipboard to {ip}: timed out")
+            result = SendResult(ip, False, time.monotonic() - submitted, e)
         except Exception as e:
             print(f"Failed to send clipboard to {ip}: {e}")
+            result = SendResult(ip, False, time.monotonic() - submitted, e)
             
-    def _monitor_clipboard(self):
-        """Monitor clipboard for changes and send to paired devices"""
-        while self.running:
-            if self.sync_enabled:
-                current_text = pyperclip.paste()
-                if current_text and current_text != self.last_sent_clipboard:
-                    self.last_sent_clipboard = current_text
-                    # Send to all devices that are enabled for sending
-                    for device in self.device_manager.get_active_devices():
-                        if device.status == DeviceStatus.PAIRED and device.send_enabled:
-                            self._send_clipboard_to_ip(device.ip, current_text)
-            time.sleep(1)
+        self._record_send_result(result)
+        return result
+        
+    async def _send_locked(self, ip, payload, capabilities):
+        """Send payload to ip, returning the CompressionStats of the last frame and the peer's acknowledgement, if any"""
+        # Bound the number of concurrent sends; the peer's send queue already keeps its sends in order
+        async with self.send_semaphore:
+            if "delta" not in capabilities:
+                # Older peers never acknowledge, so just write the frame
+                flags, data, stats = await payload.for_peer(capabilities, self.processor)
+                self._record_compression(stats)
+                if capabilities:
+                    await self.connection_pool.send(ip, data, flags, self.max_payload_size)
+                else:
+                    # Peers from before framing advertise nothing; with no codecs data is the plain JSON message
+                    await self.connection_pool.send_unframed(ip, data, self.max_payload_size)
+                self._count_sent(ip, payload.message.type, stats.wire_size)
+                return stats, None
+                
+            # Deltas and offers only apply to plain text; items with other formats are always sent whole
+            text_only = payload.message.type == MessageType.CLIPBOARD_DATA
+            delta = text_only and await self._delta_payload(ip, payload)
+            if delta:
+                stats, ack = await self._send_acknowledged(ip, delta, capabilities)
+                if ack.data.get("ok"):
+                    self.delta_stats["deltas"] += 1
+                    self.delta_stats["bytes_saved"] += len(payload.message.payload) - len(delta.message.payload)
+                    self.sent_versions[ip] = (payload.version, payload.text)
+                    return stats, ack
+                if ack.data.get("reason") != "base_mismatch":
+                    return stats, ack
+                # The peer lost our base, for example after a restart, so fall back to a full send
+                self.delta_stats["mismatches"] += 1
+                self.sent_versions.pop(ip, None)
+                
+            if text_only and "offer" in capabilities and len(payload.message.payload) >= OFFER_MIN_SIZE:
+                offer = self._offer_payload(payload)
+                stats, ack = await self._send_acknowledged(ip, offer, capabilities)
+                self.offer_stats["offers"] += 1
+                if ack.data.get("ok"):
+                    # The peer already held the content, so the body never crosses the network
+                    self.offer_stats["bodies_skipped"] += 1
+                    self.offer_stats["bytes_skipped"] += len(payload.message.payload)
+                    self.sent_versions[ip] = (payload.version, payload.text)
+                    return stats, ack
+                if ack.data.get("reason") != "need":
+                    return stats, ack
+                    
+            stats, ack = await self._send_acknowledged(ip, payload, capabilities)
+            self.delta_stats["full"] += 1
+            if ack.data.get("ok") and text_only and len(payload.text) <= DELTA_MAX_SIZE:
+                self.sent_versions[ip] = (payload.version, payload.text)
+            return stats, ack
             
-    def _check_device_timeouts(self):
-        """Check for devices that haven't been seen recently"""
-        while self.running:
-            active_devices = self.device_manager.get_active_devices()
-            all_devices = list(self.device_manager.devices.values())
+    async def _send_acknowledged(self, ip, payload, capabilities):
+        flags, data, stats = await payload.for_peer(capabilities, self.processor)
+        self._record_compression(stats)
+        ack = await self.connection_pool.send(
+            ip, data, flags, self.max_payload_size,
+            lambda reader: self._read_ack(reader, ip, payload.message.id)
+        )
+        self._count_sent(ip, payload.message.type, stats.wire_size)
+        return stats, ack
+        
+    async def _read_ack(self, reader, ip, ref):
+        """Read frames until the acknowledgement for message ref arrives"""
+        while True:
+            frame = await read_frame(reader, self.max_payload_size)
+            if not frame:
+                raise ConnectionError("Connection closed before the clipboard was acknowledged")
+            message = await self._decode_frame(*frame)
+            self._count_received(ip, message, len(frame[1]))
+            # Acks for earlier sends that we did not wait for can still be queued
+            if message and message.type == MessageType.CLIPBOARD_ACK and message.data.get("ref") == ref:
+                return message
+                
+    def _record_compression(self, stats):
+        self.compression_totals["messages"] += 1
+        self.compression_totals["original_bytes"] += stats.original_size
+        self.compression_totals["wire_bytes"] += stats.wire_size
+        self.compression_totals["cpu_time"] += stats.cpu_time
+        
+    def _record_send_result(self, result):
+        self.send_results[result.ip] = result
+        if not result.success:
+            # The peer may not hold what we relayed, so let the next copy of it through
+            self.relay_versions.pop(result.ip, None)
+        SEND_LATENCY.observe(result.latency, peer=result.ip)
+        if not result.success:
+            if isinstance(result.error, SendRejected):
+                kind = "rejected"
+            else:
+                kind = "timeout" if isinstance(result.error, asyncio.TimeoutError) else "send"
+            CONNECTION_ERRORS.inc(peer=result.ip, kind=kind)
+        for callback in self.send_result_callbacks:
+            call_timed("send_result", callback, result)
             
-            for device in all_devices:
-                if not device.is_active(DEVICE_TIMEOUT) and device.status == DeviceStatus.PAIRED:
-                    # Mark as disconnected
-                    device.status = DeviceStatus.DISCONNECTED
-                    self.notify("Device Disconnected", f"{device.hostname} ({device.ip}) is now offline")
-                    self.device_manager.notify_device_updates()
-                    
-            time.sleep(5)
\ No newline at end of file
+    def register_send_result_callback(self, callback):
+        self.send_result_callbacks.append(callback)
+        
+    def broadcast_clipboard(self, item):
+        """Send a ClipboardItem or text to every eligible peer in parallel, returning a future for the list of SendResults"""
+        if isinstance(item, str):
+            item = ClipboardItem.from_text(item)
+        return self._run_coroutine(self._broadcast_clipboard(self._stamp(item)))
+        
+    async def _broadcast_clipboard(self, item):
+        """Send a stamped item to every eligible peer"""
+        devices = [
+            device for device in self.device_manager.get_active_devices()
+            if device.status == DeviceStatus.PAIRED and device.send_enabled
+        ]
+        relays = [device for device in devices if "relay" in device.capabilities]
+        results = []
+        if relays and self.prefer_relay and not self.relay:
+            # Send once to the hubs and let them fan out, naming the peers we may send to so
+            # that nobody we never paired with, or stopped sending to, gets the item
+            devices = [device for device in devices if device not in relays]
+            results = await self._send_to_devices(item, relays, {"recipients": [device.ip for device in devices]})
+            relayed = {ip for result in results if result.success and result.relayed for ip in result.relayed}
+            # Peers no hub reached, for example ones not paired with a hub, still get it directly
+            devices = [device for device in devices if device.ip not in relayed]
+        return results + await self._send_to_devices(item, devices)
+        
+    async def _send_to_devices(self, item, devices, fields=None):
+        payloads = {}
+        sends = []
+        for device in devices:
+            # Each peer only gets the formats it accepts, encoded once per distinct set
+            payload = self._payload_for_device(item, device, payloads, fields)
+            if payload:
+                sends.append(self._enqueue_send(device.ip, payload))
+        return list(await asyncio.gather(*sends))
+        
+    def _on_clipboard_change(self, item):
+        """Called by the clipboard watcher with a ClipboardItem when the local clipboard changes"""
+        if self._take_echo(item):
+            # Already in history and already stamped by its origin; sending it on would bounce it around the mesh
+            self._count_suppressed("echoes")
+            return
+        text = item.text
+        if text is not None:
+            self.history.append(text, self.local_ip, True)
+        if self._shares_copies():
+            # Stamped now rather than when the debounce window ends, so a remote item that arrives
+            # in between is ordered against the moment of the copy. Copies nobody receives stay
+            # unstamped, so they never make a later remote item look stale.
+            self._stamp(item)
+        if self.sync_enabled and self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._debounce_broadcast, item)
+            
+    def _debounce_broadcast(self, item):
+        """Collapse a burst of local clipboard changes into one broadcast of the latest item"""
+        now = time.monotonic()
+        if self.debounce_timer:
+            self.debounce_timer.cancel()
+            self.queue_stats["debounced"] += 1
+        else:
+            self.debounce_started = now
+        self.debounce_item = item
+        # Each change restarts the window, but a long burst cannot hold the latest text back forever
+        delay = min(self.debounce_window, self.debounce_started + DEBOUNCE_MAX_DELAY - now)
+        self.debounce_timer = self.loop.call_later(max(delay, 0), self._flush_debounced)
+        
+    def _flush_debounced(self):
+        item = self.debounce_item
+        self.debounce_timer = self.debounce_item = None
+        if item.origin is None:
+            if not self._shares_copies():
+                return
+            # Copied while no peer could receive it, and one has appeared since
+            self._stamp(item)
+        elif self.current_stamp and (item.clock, item.origin) < self.current_stamp:
+            # A newer remote item was applied while this copy waited; sending it would overwrite
+            # that item on its origin while our own clipboard keeps it
+            self.queue_stats["superseded"] += 1
+            return
+        self.loop.create_task(self._broadcast_clipboard(item))
+            
+    def resend_history_entry(self, digest, ip=None):
+        """Send a clipboard history entry again, to one device or to every eligible peer
+        
+        Returns a future for the SendResults, or None if the entry is no longer in history.
+        """
+        text = self.history.get(digest)
+        if text is None:
+            return None
+        if ip is None:
+            return self.broadcast_clipboard(text)
+        if not self.device_manager.can_send_to(ip):
+            return None
+        item = self._stamp(ClipboardItem.from_text(text))
+        return self._run_coroutine(self._send_queued(ip, self._item_payload(item)))
+            
+    def _on_device_expired(self, ip):
+        """Called on the event loop when a device has not been seen for DEVICE_TIMEOUT"""
+        device = self.device_manager.get_device(ip)
+        if device and device.status == DeviceStatus.PAIRED:
+            # Mark as disconnected
+            self.device_manager.set_device_status(ip, DeviceStatus.DISCONNECTED)
+            self.notify("Device Disconnected", f"{device.hostname} ({ip}) is now offline")
+            self._speed_up_beacons()
@@ -0,0 +1,247 @@
+"""Hashing, compression, decompression and line deltas of large clipboard payloads away from the event loop.
+
+Payloads smaller than OFFLOAD_MIN_SIZE are processed inline, where handing them over would cost
+more than the work itself. Larger ones are copied into a shared memory block and processed by a
+pool of worker processes, which write their result into the same block after the input, so
+neither the payload nor the result is ever pickled.
+"""
+import asyncio
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from config import OFFLOAD_MIN_SIZE, OFFLOAD_WORKERS, DELTA_INLINE_SIZE
+from clipboard import item_digest
+from compression import compress_payload, decompress_payload, choose_codec, declared_size, CODEC_NONE
+from delta import make_delta, encode_delta
+
+# Where Linux keeps shared memory; it is a tmpfs, and writing past its size kills the process with SIGBUS
+SHM_DIR = "/dev/shm"
+# Bytes copied into or out of a block between returns to the event loop; the first write to each
+# page of a new block is slow, so copying a large payload in one go would stall the loop
+COPY_CHUNK = 4 * 1024 * 1024
+# Room reserved for a decompressed payload whose size is not recorded, as a multiple of its compressed size
+INFLATE_GUESS_RATIO = 4
+
+# Worker side. Each function attaches to the block by name, reads size bytes of input from its start
+# and returns (bytes written after the input, value). Views into the block are released before it is closed.
+
+def _compress_shared(name, size, peer_codecs):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        with block.buf[:size] as data:
+            codec, payload, stats = compress_payload(data, peer_codecs)
+            if codec == CODEC_NONE:
+                # Not worth compressing; the caller keeps sending its own copy
+                return 0, (codec, stats)
+            block.buf[size:size + len(payload)] = payload
+            return len(payload), (codec, stats)
+    finally:
+        block.close()
+
+def _decompress_shared(name, size, codec, max_size):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        with block.buf[:size] as data:
+            payload = decompress_payload(data, codec, max_size)
+        if size + len(payload) > block.size:
+            # More than the room reserved for it; the caller retries with exactly this much
+            return 0, len(payload)
+        block.buf[size:size + len(payload)] = payload
+        return len(payload), None
+    finally:
+        block.close()
+
+def _digest_shared(name, size, layout):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        with block.buf[:size] as data:
+            formats = {}
+            offset = 0
+            for mime, length in layout:
+                formats[mime] = data[offset:offset + length]
+                offset += length
+            try:
+                return 0, item_digest(formats)
+            finally:
+                for body in formats.values():
+                    body.release()
+    finally:
+        block.close()
+
+def encoded_delta(base, text, limit):
+    """encode_delta(make_delta(base, text)), or None when it is longer than limit bytes"""
+    # Encoding escapes but never shortens inserted text, so more of it than limit cannot fit
+    ops = make_delta(base, text, max_insert=limit)
+    if ops is None:
+        return None
+    encoded = encode_delta(ops)
+    return encoded if len(encoded) <= limit else None
+
+def _delta_shared(name, size, base_size, limit):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        base = bytes(block.buf[:base_size]).decode("utf-8")
+        text = bytes(block.buf[base_size:size]).decode("utf-8")
+        encoded = encoded_delta(base, text, limit)
+        if encoded is None:
+            return 0, False
+        block.buf[size:size + len(encoded)] = encoded
+        return len(encoded), True
+    finally:
+        block.close()
+
+async def _copy_into(block, parts):
+    offset = 0
+    for part in parts:
+        with memoryview(part) as source:
+            for start in range(0, len(source), COPY_CHUNK):
+                chunk = source[start:start + COPY_CHUNK]
+                block.buf[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+                await asyncio.sleep(0)
+
+async def _copy_out(block, start, end):
+    # Growing a bytearray reallocates in place for large sizes, so this copies each byte once
+    result = bytearray()
+    for offset in range(start, end, COPY_CHUNK):
+        result += block.buf[offset:min(offset + COPY_CHUNK, end)]
+        await asyncio.sleep(0)
+    return result
+
+class PayloadProcessor:
+    """Runs CPU-heavy payload work inline for small payloads and in worker processes for large ones
+    
+    Every method is a coroutine for the event loop thread. When worker processes or shared memory
+    are not available, large payloads are processed on a thread instead.
+    """
+    
+    def __init__(self, min_size=OFFLOAD_MIN_SIZE, workers=OFFLOAD_WORKERS):
+        self.min_size = min_size
+        self.workers = workers
+        self.pool = None  # started with the first large payload, since spawning workers takes a while
+        self.disabled = False
+        self.stats = {"inline": 0, "offloaded": 0, "threaded": 0}
+        
+    async def compress(self, data, peer_codecs):
+        """compress_payload for data (bytes or a list of buffers)"""
+        parts = data if isinstance(data, list) else [data]
+        size = sum(len(part) for part in parts)
+        if size < self.min_size or choose_codec(size, peer_codecs)[0] == CODEC_NONE:
+            self.stats["inline"] += 1
+            return compress_payload(data, peer_codecs)
+        # Compressed output is only kept when smaller than the input, so the input size is room enough
+        result = await self._run_shared(_compress_shared, parts, size, size, peer_codecs)
+        if result is None:
+            return await self._run_threaded(compress_payload, data, peer_codecs)
+        (codec, stats), compressed = result
+        return codec, data if codec == CODEC_NONE else compressed, stats
+        
+    async def decompress(self, data, codec, max_size):
+        """decompress_payload, with the same limit on the inflated size"""
+        if codec == CODEC_NONE:
+            return data
+        if len(data) < self.min_size:
+            self.stats["inline"] += 1
+            return decompress_payload(data, codec, max_size)
+        # Reserving max_size for every frame would tie up that much shared memory per call
+        capacity = declared_size(data, codec) or len(data) * INFLATE_GUESS_RATIO
+        result = await self._run_shared(_decompress_shared, [data], len(data), min(capacity, max_size), codec, max_size)
+        if result is not None and result[0]:
+            result = await self._run_shared(_decompress_shared, [data], len(data), result[0], codec, max_size)
+        if result is None:
+            return await self._run_threaded(decompress_payload, data, codec, max_size)
+        return result[1] or b""
+        
+    async def digest(self, formats):
+        """item_digest for formats (MIME type -> body)"""
+        size = sum(len(body) for body in formats.values())
+        if size < self.min_size:
+            self.stats["inline"] += 1
+            return item_digest(formats)
+        layout = [(mime, len(body)) for mime, body in formats.items()]
+        result = await self._run_shared(_digest_shared, list(formats.values()), size, 0, layout)
+        if result is None:
+            return await self._run_threaded(item_digest, formats)
+        return result[0]
+        
+    async def call(self, size, function, *args):
+        """function(*args), inline when size is below min_size and on a thread otherwise
+        
+        For work on Python strings, which cannot come back through shared memory without being pickled.
+        """
+        if size < self.min_size:
+            self.stats["inline"] += 1
+            return function(*args)
+        return await self._run_threaded(function, *args)
+        
+    async def delta(self, base, text, limit):
+        """encoded_delta for base and text (str), None when the delta would be longer than limit bytes"""
+        if len(text) < min(self.min_size, DELTA_INLINE_SIZE):
+            self.stats["inline"] += 1
+            return encoded_delta(base, text, limit)
+        if len(text) < self.min_size:
+            return await self._run_threaded(encoded_delta, base, text, limit)
+        base_bytes = base.encode("utf-8")
+        text_bytes = text.encode("utf-8")
+        limit = int(limit)
+        result = await self._run_shared(_delta_shared, [base_bytes, text_bytes], len(base_bytes) + len(text_bytes), limit, len(base_bytes), limit)
+        if result is None:
+            # Pure Python, so the thread holds the GIL; the loop still gets a turn every switch interval
+            return await self._run_threaded(encoded_delta, base, text, limit)
+        found, encoded = result
+        return bytes(encoded or b"") if found else None
+        
+    async def _run_shared(self, function, parts, size, capacity, *args):
+        """Run function(name, size, *args) in a worker on a block holding parts followed by capacity free bytes
+        
+        Returns (value, output), output being the bytes the worker wrote after the input or None, or
+        returns None when worker processes cannot be used.
+        """
+        if self.disabled or not self._has_room(size + capacity):
+            return None
+        try:
+            block = shared_memory.SharedMemory(create=True, size=size + capacity)
+        except OSError as e:
+            self._disable(e)
+            return None
+        try:
+            await _copy_into(block, parts)
+            length, value = await asyncio.get_running_loop().run_in_executor(self._pool(), function, block.name, size, *args)
+            self.stats["offloaded"] += 1
+            return value, await _copy_out(block, size, size + length) if length else None
+        except (BrokenProcessPool, OSError) as e:
+            self._disable(e)
+            return None
+        finally:
+            # A worker still reading after a cancelled send keeps its own mapping until it is done
+            block.close()
+            block.unlink()
+            
+    async def _run_threaded(self, function, *args):
+        # zlib, zstandard and hashlib release the GIL on large buffers, so a thread still keeps the loop responsive
+        self.stats["threaded"] += 1
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+        
+    def _pool(self):
+        if self.pool is None:
+            # Spawned rather than forked, since forking copies the other threads' state mid-flight
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+        
+    def _has_room(self, size):
+        if not os.path.isdir(SHM_DIR):
+            return True
+        return shutil.disk_usage(SHM_DIR).free >= size
+        
+    def _disable(self, error):
+        print(f"Processing large payloads on a thread instead of worker processes: {error}")
+        self.disabled = True
+        self.close()
+        
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
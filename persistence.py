@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from config import PERSIST_DELAY
+
+def atomic_write_json(path, data):
+    """Write data as JSON so that path holds either the old or the new content, even after a crash"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+        
+    # Persist the rename itself; directories cannot be opened this way on Windows
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+class WriteBehindStore:
+    """Writes snapshot() to a JSON file on a background thread after changes are marked dirty.
+    
+    Changes arriving within delay seconds of each other are coalesced into one write.
+    """
+    
+    def __init__(self, path, snapshot, delay=PERSIST_DELAY):
+        self.path = path
+        self.snapshot = snapshot  # called on the writer thread; must return JSON-serialisable data
+        self.delay = delay
+        self.dirty = threading.Event()
+        self.closed = False
+        self.write_lock = threading.Lock()
+        self.writes = 0
+        self.thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+        self.thread.start()
+        
+    def mark_dirty(self):
+        self.dirty.set()
+        
+    def _run(self):
+        while not self.closed:
+            self.dirty.wait()
+            if self.closed:
+                return
+            # Give a burst of changes time to land before writing once
+            time.sleep(self.delay)
+            if self.closed:
+                return
+            self.flush()
+            
+    def flush(self):
+        """Write now if anything changed since the last write"""
+        with self.write_lock:
+            if not self.dirty.is_set():
+                return
+            self.dirty.clear()
+            try:
+                atomic_write_json(self.path, self.snapshot())
+                self.writes += 1
+            except Exception as e:
+                print(f"Error saving {self.path}: {e}")
+                
+    def close(self):
+        self.closed = True
+        self.flush()
+        # Wake the writer thread so it can exit
+        self.dirty.set()
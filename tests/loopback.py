@@ -0,0 +1,67 @@
+"""NetworkManagers on their own loopback addresses, with in-memory clipboards and no discovery"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+class Peer:
+    def __init__(self, index, home, clipboard=None):
+        # Imported here so DeviceManager, the device id and the clock pick up the temporary HOME
+        from clipboard import FakeClipboard
+        from device_manager import DeviceManager
+        from history import ClipboardHistory
+        from network import NetworkManager
+        
+        self.ip = f"127.0.0.{index + 20}"
+        self.clipboard = clipboard or FakeClipboard()
+        self.device_manager = DeviceManager()
+        history = ClipboardHistory(os.path.join(home, f"history-{index}.ring"))
+        self.network = NetworkManager(self.device_manager, self.clipboard, history, bind_ip=self.ip)
+        self.network.discovery_enabled = False
+        self.network.metrics_port = None
+        self.network.metrics_socket = None
+        
+    def pair(self, other, send=True, receive=True):
+        from device_manager import DeviceStatus
+        device = self.device_manager.add_or_update_device(other.ip, other.ip, DeviceStatus.PAIRED, other.network.capabilities)
+        device.send_enabled = send
+        device.receive_enabled = receive
+        
+    def text(self):
+        return self.clipboard.paste()
+
+class LoopbackTestCase(unittest.TestCase):
+    """Runs peers in a temporary HOME and stops them after each test"""
+    
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix="clipboardsync-test-")
+        self.old_home = os.environ.get("HOME")
+        os.environ["HOME"] = self.home
+        self.peers = []
+        
+    def tearDown(self):
+        for peer in self.peers:
+            peer.network.stop()
+            peer.device_manager.close()
+        if self.old_home is None:
+            os.environ.pop("HOME", None)
+        else:
+            os.environ["HOME"] = self.old_home
+        shutil.rmtree(self.home, ignore_errors=True)
+        
+    def make_peers(self, count):
+        self.peers = [Peer(index, self.home) for index in range(count)]
+        return self.peers
+        
+    def start(self):
+        for peer in self.peers:
+            peer.network.start()
+            
+    def wait_until(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.02)
+        return True
@@ -0,0 +1,24 @@
+import unittest
+
+from clipboard import ClipboardHelper, CommandFormats, CommandFormatsMixin, PyperclipBackend
+
+class ListingBackend(CommandFormatsMixin, PyperclipBackend):
+    pass
+
+class ClipboardHelperTest(unittest.TestCase):
+    def setUp(self):
+        self.helper = ClipboardHelper(fake=True)
+        self.addCleanup(self.helper.close)
+        
+    def test_targets_follow_copies(self):
+        self.assertEqual(self.helper.targets(), [])
+        self.helper.copy("hello")
+        self.assertIn("UTF8_STRING", self.helper.targets())
+        
+    def test_formats_listed_without_forking(self):
+        backend = ListingBackend(self.helper)
+        # Running the list command would raise, since it does not exist
+        backend.rich = CommandFormats(["/nonexistent/list-targets"], ["/nonexistent/paste"], ["/nonexistent/copy"])
+        self.helper.copy("hello")
+        self.assertEqual(backend.paste_item().text, "hello")
+        self.assertEqual(self.helper.starts, 1)
@@ -0,0 +1,52 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from history import ClipboardHistory
+
+class ClipboardHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="clipboardsync-test-")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, "history.ring")
+        # Small enough that the ring wraps and the oldest entries are evicted
+        self.history = ClipboardHistory(self.path, capacity=16 * 1024)
+        self.addCleanup(self.history.close)
+        
+    def test_pages_cover_every_entry_newest_first(self):
+        for index in range(500):
+            self.history.append(f"item {index}", "127.0.0.1", True)
+        expected = [entry.seq for entry in reversed(self.history.entries)]
+        pages = []
+        before = None
+        while True:
+            page = self.history.list(limit=7, before=before)
+            if not page:
+                break
+            pages += [entry["seq"] for entry in page]
+            before = page[-1]["seq"]
+        self.assertEqual(pages, expected)
+        self.assertEqual(self.history.list(before=expected[-1]), [])
+        
+    def test_ring_held_by_another_process_is_not_written(self):
+        self.history.append("kept", "127.0.0.1", True)
+        script = (
+            "import sys\n"
+            "from history import ClipboardHistory\n"
+            "history = ClipboardHistory(sys.argv[1], capacity=16 * 1024)\n"
+            "history.append('from the other process', '127.0.0.2', True)\n"
+            "print(len(history), history.file is None)\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script, self.path], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout
+        self.assertTrue(output.endswith("1 True\n"))
+        self.history.close()
+        reopened = ClipboardHistory(self.path, capacity=16 * 1024)
+        self.addCleanup(reopened.close)
+        self.assertEqual([entry["seq"] for entry in reopened.list()], [1])
+        self.assertEqual(reopened.get(reopened.entries[0].digest), "kept")
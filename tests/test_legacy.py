@@ -0,0 +1,60 @@
+import json
+import socket
+import threading
+
+from config import BUFFER_SIZE, PAIRING_PORT, PORT
+from tests.loopback import LoopbackTestCase
+
+class BaselinePeer:
+    """Reads messages the way peers from before framing do: one recv per connection, parsed as JSON"""
+    
+    def __init__(self, ip, port):
+        self.messages = []
+        self.server = socket.create_server((ip, port))
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                conn.settimeout(5)
+                self.messages.append(json.loads(conn.recv(BUFFER_SIZE).decode("utf-8")))
+                
+    def close(self):
+        self.server.close()
+
+class LegacyWireTest(LoopbackTestCase):
+    def setUp(self):
+        super().setUp()
+        from device_manager import DeviceStatus
+        [self.sender] = self.make_peers(1)
+        self.baseline_ip = "127.0.0.60"
+        # Its discovery beacons carry no capabilities
+        device = self.sender.device_manager.add_or_update_device(self.baseline_ip, "baseline", DeviceStatus.PAIRED, [])
+        device.send_enabled = True
+        
+    def listen(self, port):
+        peer = BaselinePeer(self.baseline_ip, port)
+        self.addCleanup(peer.close)
+        return peer
+        
+    def test_clipboard_reaches_peer_without_capabilities(self):
+        baseline = self.listen(PORT)
+        self.start()
+        [result] = self.sender.network.broadcast_clipboard("for an old peer").result(10)
+        self.assertTrue(result.success)
+        self.assertTrue(self.wait_until(lambda: baseline.messages))
+        [message] = baseline.messages
+        self.assertEqual(message["type"], "clipboard_data")
+        self.assertEqual(message["data"]["text"], "for an old peer")
+        
+    def test_pairing_request_reaches_peer_without_capabilities(self):
+        baseline = self.listen(PAIRING_PORT)
+        self.start()
+        self.sender.network._request_pairing(self.baseline_ip)
+        self.assertTrue(self.wait_until(lambda: baseline.messages))
+        self.assertEqual(baseline.messages[0]["type"], "pairing_request")
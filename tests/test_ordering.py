@@ -0,0 +1,31 @@
+import time
+from tests.loopback import LoopbackTestCase
+
+class ConcurrentCopyTest(LoopbackTestCase):
+    def test_copies_made_together_converge(self):
+        a, b = self.make_peers(2)
+        a.pair(b)
+        b.pair(a)
+        self.start()
+        for round in range(5):
+            a.clipboard.copy(f"X{round}")
+            # Inside the debounce window, so both copies are in flight at once
+            time.sleep(0.03)
+            b.clipboard.copy(f"Y{round}")
+            self.wait_until(lambda: a.text() == b.text())
+            time.sleep(0.5)
+            self.assertEqual(a.text(), b.text())
+            self.assertIn(a.text(), (f"X{round}", f"Y{round}"))
+            
+    def test_copy_from_peer_behind_is_not_stale(self):
+        a, b = self.make_peers(2)
+        # A only receives and its clock is far ahead, for example after running with a skewed wall clock
+        a.network.clock = b.network.clock + 120000
+        a.pair(b, send=False)
+        b.pair(a, receive=False)
+        self.start()
+        a.clipboard.copy("local to a")
+        time.sleep(0.3)
+        b.clipboard.copy("from b")
+        self.assertTrue(self.wait_until(lambda: a.text() == "from b"))
+        self.assertEqual(a.network.echo_stats["stale"], 0)
@@ -0,0 +1,34 @@
+import time
+from tests.loopback import LoopbackTestCase
+
+class RelayPermissionTest(LoopbackTestCase):
+    def make_hub_peers(self):
+        a, b, hub = self.make_peers(3)
+        hub.network.relay = True
+        hub.network.capabilities.append("relay")
+        for peer in (a, b):
+            peer.pair(hub)
+            hub.pair(peer)
+        a.pair(b)
+        b.pair(a)
+        return a, b, hub
+        
+    def test_receiver_permission_for_origin_applies_through_hub(self):
+        a, b, hub = self.make_hub_peers()
+        b.device_manager.set_receive_enabled(a.ip, False)
+        self.start()
+        a.clipboard.copy("blocked")
+        time.sleep(1)
+        self.assertEqual(b.text(), "")
+        
+        b.device_manager.set_receive_enabled(a.ip, True)
+        a.clipboard.copy("allowed")
+        self.assertTrue(self.wait_until(lambda: b.text() == "allowed"))
+        self.assertEqual(hub.network.relay_stats["fanout"], 2)
+        
+    def test_hub_reports_only_peers_that_acknowledged(self):
+        a, b, hub = self.make_hub_peers()
+        self.start()
+        result = a.network.broadcast_clipboard("through the hub").result(10)
+        self.assertEqual([(r.ip, r.relayed) for r in result], [(hub.ip, [b.ip])])
+        self.assertTrue(self.wait_until(lambda: b.text() == "through the hub"))
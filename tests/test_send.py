@@ -0,0 +1,24 @@
+from network import SendRejected
+from tests.loopback import LoopbackTestCase
+
+class SendResultTest(LoopbackTestCase):
+    def test_rejected_item_is_reported_as_failed(self):
+        a, b = self.make_peers(2)
+        a.pair(b)
+        b.pair(a, receive=False)
+        self.start()
+        [result] = a.network.broadcast_clipboard("not wanted").result(10)
+        self.assertFalse(result.success)
+        self.assertIsInstance(result.error, SendRejected)
+        self.assertEqual(str(result.error), "not_allowed")
+        self.assertEqual(b.text(), "")
+        
+    def test_applied_item_is_reported_as_sent(self):
+        a, b = self.make_peers(2)
+        a.pair(b)
+        b.pair(a)
+        self.start()
+        [result] = a.network.broadcast_clipboard("wanted").result(10)
+        self.assertTrue(result.success)
+        self.assertIsNone(result.error)
+        self.assertEqual(b.text(), "wanted")
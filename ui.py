@@ -1,9 +1,11 @@
 ### ui.py
 import tkinter as tk
 from tkinter import ttk, messagebox
+import bisect
+import queue
 import threading
 import time
-from device_manager import DeviceStatus
+from device_manager import DeviceStatus, DeviceEvent
 
 class NotificationManager:
     def __init__(self, root):
@@ -57,6 +59,136 @@ class NotificationManager:
         if self.notifications:
             self.root.after(100, self._process_notifications)
 
+# Rows have a fixed height so the visible range follows from the scroll position alone
+ROW_HEIGHT = 110  # pixels
+ROW_OVERSCAN = 2  # rows built above and below the visible area
+UI_QUEUE_INTERVAL = 50  # milliseconds between drains of the UI update queue
+LAST_SEEN_REFRESH = 5000  # milliseconds between refreshes of the "last seen" labels
+
+def device_sort_key(device):
+    # Paired first, then discovered, then disconnected
+    rank = 0 if device.status == DeviceStatus.PAIRED else 1 if device.status == DeviceStatus.DISCOVERED else 2
+    return (rank, device.hostname, device.ip)
+
+class DeviceRow:
+    """Widgets for one visible device; update() only touches the fields that changed"""
+    
+    def __init__(self, ui, device, index):
+        self.ui = ui
+        self.ip = device.ip
+        self.index = index
+        canvas = ui.devices_canvas
+        
+        self.container = ttk.LabelFrame(canvas, padding=10)
+        self.item = canvas.create_window(
+            5, index * ROW_HEIGHT + 5, window=self.container, anchor="nw",
+            width=max(canvas.winfo_width() - 10, 1), height=ROW_HEIGHT - 10
+        )
+        
+        status_frame = ttk.Frame(self.container)
+        status_frame.pack(fill="x", pady=(0, 5))
+        self.status_indicator = tk.Canvas(status_frame, width=15, height=15, bd=0, highlightthickness=0)
+        self.status_indicator.pack(side="left", padx=(0, 5))
+        self.status_label = ttk.Label(status_frame)
+        self.status_label.pack(side="left")
+        self.last_seen_label = ttk.Label(status_frame)
+        self.last_seen_label.pack(side="right")
+        
+        self.controls_frame = ttk.Frame(self.container)
+        self.controls_frame.pack(fill="x", pady=5)
+        self.send_var = tk.BooleanVar()
+        self.receive_var = tk.BooleanVar()
+        
+        self.fields = {}
+        self.update(device)
+        
+    def _set(self, name, value, apply):
+        if self.fields.get(name) != value:
+            self.fields[name] = value
+            apply(value)
+            
+    def update(self, device):
+        self._set("title", f"{device.hostname} ({device.ip})", lambda text: self.container.config(text=text))
+        self._set("status", device.status, self._apply_status)
+        self._set("controls", (device.status, device.pairing_pending), self._build_controls)
+        self._set("send", device.send_enabled, self.send_var.set)
+        self._set("receive", device.receive_enabled, self.receive_var.set)
+        self.update_last_seen(device)
+        
+    def update_last_seen(self, device):
+        text = "Online" if device.is_active() else f"Last seen: {time.strftime('%H:%M:%S', time.localtime(device.last_seen))}"
+        self._set("last_seen", text, lambda text: self.last_seen_label.config(text=text))
+        
+    def _apply_status(self, status):
+        self.status_indicator.config(bg=self.ui.colors.get(status, self.ui.colors["disconnected"]))
+        self.status_label.config(text=status.capitalize())
+        
+    def _build_controls(self, state):
+        # Controls depend only on status and pairing state, so they are rebuilt when those change
+        status, pairing_pending = state
+        for widget in self.controls_frame.winfo_children():
+            widget.destroy()
+            
+        ip = self.ip
+        ui = self.ui
+        if status == DeviceStatus.PAIRED:
+            ttk.Checkbutton(
+                self.controls_frame,
+                text="Send Clipboard",
+                variable=self.send_var,
+                command=lambda: ui.device_manager.set_send_enabled(ip, self.send_var.get())
+            ).pack(side="left", padx=5)
+            ttk.Checkbutton(
+                self.controls_frame,
+                text="Receive Clipboard",
+                variable=self.receive_var,
+                command=lambda: ui.device_manager.set_receive_enabled(ip, self.receive_var.get())
+            ).pack(side="left", padx=5)
+            ttk.Button(
+                self.controls_frame,
+                text="Send Now",
+                command=lambda: ui.network_manager.send_clipboard_to_device(ip)
+            ).pack(side="left", padx=5)
+            ttk.Button(
+                self.controls_frame,
+                text="Disconnect",
+                command=lambda: ui._disconnect_device(ip)
+            ).pack(side="right", padx=5)
+            
+        elif status == DeviceStatus.DISCOVERED and not pairing_pending:
+            ttk.Button(
+                self.controls_frame,
+                text="Request Pairing",
+                command=lambda: ui._request_pairing(ip)
+            ).pack(side="left", padx=5)
+            
+        elif status == DeviceStatus.DISCOVERED and pairing_pending:
+            ttk.Label(self.controls_frame, text="Pairing request pending...").pack(side="left", padx=5)
+            
+        elif status == DeviceStatus.DISCONNECTED:
+            ttk.Button(
+                self.controls_frame,
+                text="Attempt Reconnect",
+                command=lambda: ui._request_pairing(ip)
+            ).pack(side="left", padx=5)
+            ttk.Button(
+                self.controls_frame,
+                text="Remove",
+                command=lambda: ui.device_manager.remove_device(ip)
+            ).pack(side="right", padx=5)
+            
+    def move(self, index):
+        if index != self.index:
+            self.index = index
+            self.ui.devices_canvas.coords(self.item, 5, index * ROW_HEIGHT + 5)
+            
+    def resize(self, width):
+        self.ui.devices_canvas.itemconfig(self.item, width=max(width - 10, 1))
+        
+    def destroy(self):
+        self.ui.devices_canvas.delete(self.item)
+        self.container.destroy()
+
 class ClipboardSyncUI:
     def __init__(self, device_manager, network_manager):
         self.device_manager = device_manager
@@ -78,16 +210,49 @@ class ClipboardSyncUI:
             "disconnected": "#F44336" # Red
         }
         
+        # Other threads never touch widgets; they queue calls that the Tk thread drains
+        self.ui_queue = queue.Queue()
+        self.order = []  # (sort key, ip) of every device, in display order
+        self.sort_keys = {}  # ip -> sort key currently in self.order
+        self.rows = {}  # ip -> DeviceRow, only for rows in or near the visible area
+        self.render_pending = False
+        self.scroll_region = None
+        
         # Create UI components first
         self._create_ui()
         
         # Register callbacks AFTER UI components are created
-        self.device_manager.register_device_updates_callback(self._update_device_list)
+        self.device_manager.register_device_events_callback(self._on_device_events)
         self.device_manager.register_pairing_callback(self._handle_pairing_request)
         
         # Create notification manager
         self.notification_manager = NotificationManager(self.root)
-        self.network_manager.register_notification_callback(self.notification_manager.show)
+        self.network_manager.register_notification_callback(
+            lambda title, message: self._call_in_ui(self.notification_manager.show, title, message)
+        )
+        self.root.after(UI_QUEUE_INTERVAL, self._process_ui_queue)
+        self.root.after(LAST_SEEN_REFRESH, self._refresh_last_seen)
+        
+    def _call_in_ui(self, func, *args):
+        """Run func(*args) on the Tk thread; safe to call from any thread"""
+        self.ui_queue.put((func, args))
+        
+    def _process_ui_queue(self):
+        try:
+            while True:
+                try:
+                    func, args = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    func(*args)
+                except Exception as e:
+                    # One failing call must not stop the events, notifications and dialogs queued after it
+                    print(f"Error in UI callback {getattr(func, '__name__', func)}: {e}")
+            if self.render_pending:
+                self._render_visible()
+        finally:
+            self.root.after(UI_QUEUE_INTERVAL, self._process_ui_queue)
         
     def _create_ui(self):
         main_frame = ttk.Frame(self.root, padding=10)
@@ -154,159 +319,125 @@ class ClipboardSyncUI:
         devices_frame = ttk.LabelFrame(parent, text="Nearby Devices", padding=10)
         devices_frame.pack(fill="both", expand=True)
         
-        # Scrollable frame for devices
+        # Refresh button
+        refresh_button = ttk.Button(devices_frame, text="Refresh", command=self._update_device_list)
+        refresh_button.pack(side="bottom", pady=(5, 0))
+        
+        # Scrollable canvas holding only the rows that are visible
         scroll_container = ttk.Frame(devices_frame)
         scroll_container.pack(fill="both", expand=True)
         
         # Scrollbar
-        scrollbar = ttk.Scrollbar(scroll_container)
-        scrollbar.pack(side="right", fill="y")
+        self.devices_scrollbar = ttk.Scrollbar(scroll_container)
+        self.devices_scrollbar.pack(side="right", fill="y")
         
-        # Canvas and inner frame for scrolling
-        self.devices_canvas = tk.Canvas(scroll_container, yscrollcommand=scrollbar.set)
+        self.devices_canvas = tk.Canvas(scroll_container, yscrollcommand=self._on_canvas_scroll, highlightthickness=0)
         self.devices_canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.config(command=self.devices_canvas.yview)
-        
-        self.devices_inner_frame = ttk.Frame(self.devices_canvas)
-        self.devices_canvas_window = self.devices_canvas.create_window((0, 0), window=self.devices_inner_frame, anchor="nw")
-        
-        # Update scrollregion when frame size changes
-        self.devices_inner_frame.bind("<Configure>", self._on_frame_configure)
+        self.devices_scrollbar.config(command=self.devices_canvas.yview)
+        self.empty_label = self.devices_canvas.create_text(
+            10, 20, anchor="w", text="No devices found. Ensure pairing is enabled."
+        )
         self.devices_canvas.bind("<Configure>", self._on_canvas_configure)
         
-        # Refresh button
-        refresh_button = ttk.Button(devices_frame, text="Refresh", command=self._update_device_list)
-        refresh_button.pack(side="bottom", pady=(5, 0))
-        
-    def _on_frame_configure(self, event):
-        self.devices_canvas.configure(scrollregion=self.devices_canvas.bbox("all"))
+    def _on_canvas_scroll(self, first, last):
+        self.devices_scrollbar.set(first, last)
+        self.render_pending = True
         
     def _on_canvas_configure(self, event):
-        # Update the window width when canvas resizes
-        self.devices_canvas.itemconfig(self.devices_canvas_window, width=event.width)
-        
-    def _update_device_list(self):
-        # Check if UI components are initialized
-        if not hasattr(self, 'devices_inner_frame') or not self.devices_inner_frame.winfo_exists():
-            # UI is not ready yet, schedule an update for later
-            self.root.after(100, self._update_device_list)
-            return
-            
-        # Clear existing widgets
-        for widget in self.devices_inner_frame.winfo_children():
-            widget.destroy()
-            
-        devices = list(self.device_manager.devices.values())
-        
-        # Sort devices: Paired first, then discovered, then disconnected
-        devices.sort(key=lambda d: (
-            0 if d.status == DeviceStatus.PAIRED else
-            1 if d.status == DeviceStatus.DISCOVERED else 2,
-            d.hostname
-        ))
-        
-        if not devices:
-            ttk.Label(self.devices_inner_frame, text="No devices found. Ensure pairing is enabled.").pack(pady=10)
-            return
+        # Keep rows as wide as the canvas and build rows that became visible
+        for row in self.rows.values():
+            row.resize(event.width)
+        self._render_visible()
+        
+    def _visible_range(self):
+        top = self.devices_canvas.canvasy(0)
+        height = self.devices_canvas.winfo_height()
+        first = max(int(top // ROW_HEIGHT) - ROW_OVERSCAN, 0)
+        last = min(int((top + height) // ROW_HEIGHT) + ROW_OVERSCAN + 1, len(self.order))
+        return first, last
+        
+    def _render_visible(self):
+        """Build rows that scrolled into view, drop those that left it and move the rest into place"""
+        self.render_pending = False
+        canvas = self.devices_canvas
+        region = (0, 0, canvas.winfo_width(), len(self.order) * ROW_HEIGHT)
+        if region != self.scroll_region:
+            # Only set it when it changed, since setting it fires the scroll callback again
+            self.scroll_region = region
+            canvas.configure(scrollregion=region)
+        canvas.itemconfig(self.empty_label, state="hidden" if self.order else "normal")
+        
+        first, last = self._visible_range()
+        visible = {ip: first + offset for offset, (_, ip) in enumerate(self.order[first:last])}
+        for ip in [ip for ip in self.rows if ip not in visible]:
+            self.rows.pop(ip).destroy()
+        for ip, index in visible.items():
+            row = self.rows.get(ip)
+            if row:
+                row.move(index)
+            else:
+                device = self.device_manager.get_device(ip)
+                if device:
+                    self.rows[ip] = DeviceRow(self, device, index)
+                    
+    def _place_device(self, device):
+        """Insert or move a device in the display order, returning True if its position changed"""
+        key = device_sort_key(device)
+        old_key = self.sort_keys.get(device.ip)
+        if old_key == key:
+            return False
+        if old_key is not None:
+            del self.order[bisect.bisect_left(self.order, (old_key, device.ip))]
+        bisect.insort(self.order, (key, device.ip))
+        self.sort_keys[device.ip] = key
+        return True
+        
+    def _forget_device(self, ip):
+        key = self.sort_keys.pop(ip, None)
+        if key is not None:
+            del self.order[bisect.bisect_left(self.order, (key, ip))]
+        row = self.rows.pop(ip, None)
+        if row:
+            row.destroy()
             
+    def _on_device_events(self, events):
+        # Runs on the DeviceManager's timer thread
+        self._call_in_ui(self._apply_device_events, events)
+        
+    def _apply_device_events(self, events):
+        for event in events:
+            if event.kind == DeviceEvent.REMOVED or event.device is None:
+                self._forget_device(event.ip)
+                self.render_pending = True
+                continue
+            if self._place_device(event.device):
+                self.render_pending = True
+            row = self.rows.get(event.ip)
+            if row:
+                row.update(event.device)
+                
+    def _update_device_list(self):
+        """Resynchronise the whole list with the DeviceManager"""
+        with self.device_manager.devices_lock:
+            devices = list(self.device_manager.devices.values())
+        current = {device.ip for device in devices}
+        for ip in [ip for ip in self.sort_keys if ip not in current]:
+            self._forget_device(ip)
         for device in devices:
-            self._create_device_widget(device)
-            
-    def _create_device_widget(self, device):
-        # Create frame for this device
-        device_frame = ttk.Frame(self.devices_inner_frame)
-        device_frame.pack(fill="x", pady=5, padx=5)
-        
-        # Add border and padding
-        container = ttk.LabelFrame(
-            device_frame, 
-            text=f"{device.hostname} ({device.ip})",
-            padding=10
-        )
-        container.pack(fill="x")
-        
-        # Status indicator
-        status_frame = ttk.Frame(container)
-        status_frame.pack(fill="x", pady=(0, 5))
-        
-        # Status color
-        status_color = self.colors.get(device.status, self.colors["disconnected"])
-        status_indicator = tk.Canvas(status_frame, width=15, height=15, bg=status_color, bd=0, highlightthickness=0)
-        status_indicator.pack(side="left", padx=(0, 5))
-        
-        # Status text
-        status_label = ttk.Label(status_frame, text=device.status.capitalize())
-        status_label.pack(side="left")
-        
-        # Last seen
-        last_seen_text = "Online" if device.is_active() else f"Last seen: {time.strftime('%H:%M:%S', time.localtime(device.last_seen))}"
-        last_seen_label = ttk.Label(status_frame, text=last_seen_text)
-        last_seen_label.pack(side="right")
+            self._place_device(device)
+            row = self.rows.get(device.ip)
+            if row:
+                row.update(device)
+        self._render_visible()
+        
+    def _refresh_last_seen(self):
+        # Heartbeats do not produce events, so visible rows re-check their "last seen" text now and then
+        for ip, row in self.rows.items():
+            device = self.device_manager.get_device(ip)
+            if device:
+                row.update_last_seen(device)
+        self.root.after(LAST_SEEN_REFRESH, self._refresh_last_seen)
         
-        # Controls frame
-        controls_frame = ttk.Frame(container)
-        controls_frame.pack(fill="x", pady=5)
-        
-        # Show appropriate controls based on device status
-        if device.status == DeviceStatus.PAIRED:
-            # Send toggle
-            send_var = tk.BooleanVar(value=device.send_enabled)
-            ttk.Checkbutton(
-                controls_frame, 
-                text="Send Clipboard", 
-                variable=send_var,
-                command=lambda: self.device_manager.set_send_enabled(device.ip, send_var.get())
-            ).pack(side="left", padx=5)
-            
-            # Receive toggle
-            receive_var = tk.BooleanVar(value=device.receive_enabled)
-            ttk.Checkbutton(
-                controls_frame, 
-                text="Receive Clipboard", 
-                variable=receive_var,
-                command=lambda: self.device_manager.set_receive_enabled(device.ip, receive_var.get())
-            ).pack(side="left", padx=5)
-            
-            # Manual send button
-            ttk.Button(
-                controls_frame,
-                text="Send Now",
-                command=lambda: self.network_manager.send_clipboard_to_device(device.ip)
-            ).pack(side="left", padx=5)
-            
-            # Disconnect button
-            ttk.Button(
-                controls_frame,
-                text="Disconnect",
-                command=lambda: self._disconnect_device(device.ip)
-            ).pack(side="right", padx=5)
-            
-        elif device.status == DeviceStatus.DISCOVERED and not device.pairing_pending:
-            # Connect button for discovered devices
-            ttk.Button(
-                controls_frame,
-                text="Request Pairing",
-                command=lambda: self._request_pairing(device.ip)
-            ).pack(side="left", padx=5)
-            
-        elif device.status == DeviceStatus.DISCOVERED and device.pairing_pending:
-            ttk.Label(controls_frame, text="Pairing request pending...").pack(side="left", padx=5)
-            
-        elif device.status == DeviceStatus.DISCONNECTED:
-            # Try reconnect button
-            ttk.Button(
-                controls_frame,
-                text="Attempt Reconnect",
-                command=lambda: self._request_pairing(device.ip)
-            ).pack(side="left", padx=5)
-            
-            # Remove button
-            ttk.Button(
-                controls_frame,
-                text="Remove",
-                command=lambda: self.device_manager.remove_device(device.ip)
-            ).pack(side="right", padx=5)
-    
     def _toggle_pairing(self):
         enabled = self.pairing_var.get()
         self.network_manager.discovery_enabled = enabled
@@ -335,7 +466,10 @@ class ClipboardSyncUI:
             self.device_manager.disconnect_device(ip)
         
     def _handle_pairing_request(self, ip, hostname):
-        # Called when a pairing request is received
+        # Called from a worker thread when a pairing request is received; the dialog belongs on the Tk thread
+        self._call_in_ui(self._ask_pairing, ip, hostname)
+        
+    def _ask_pairing(self, ip, hostname):
         result = messagebox.askyesno(
             "Pairing Request",
             f"Accept pairing request from {hostname} ({ip})?",